@@ -1,18 +1,150 @@
-from fastapi import APIRouter
+import asyncio
+from datetime import datetime, timezone
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from app.webhook import router as webhook_router
 from app.config_server import router as config_router
 from app.reset import router as reset_router
+from app.reconcile import router as reconcile_router
+from app.rules import router as rules_router
+from app.utils.tmdb import provider_cache, provider_lookups, provider_index, title_details_cache
+from app.webhook import recent_webhooks, job_queue, decision_history
+from app.utils.discord import dispatcher
+from app.utils.http import circuit_states
+from app.utils.shared import shared_store
+from app.utils.catalog import provider_catalog
+from app.utils.startup import startup_profile
+from app.utils.events import event_feed, stream
+from app.utils.metrics import render_metrics
 
 # Create a master router
 api_router = APIRouter()
+# Routes machine clients may call with the API key instead of a session
+machine_router = APIRouter()
 
 # Mount feature routers
-api_router.include_router(webhook_router, prefix="/webhook")
+machine_router.include_router(webhook_router, prefix="/webhook")
 api_router.include_router(config_router, prefix="/config")
 api_router.include_router(reset_router, prefix="/reset")
+api_router.include_router(reconcile_router, prefix="/reconcile")
+api_router.include_router(rules_router, prefix="/rules")
 
 
-# Health check route
+# Health check route; 503 until startup warm-up has finished
 @api_router.get("/healthz")
-async def health_check():
-    return {"status": "ok"}
+async def health_check(response: Response):
+    if not startup_profile.ready:
+        response.status_code = 503
+        return {"status": "warming", "startup": startup_profile.report()}
+    return {"status": "ok", "startup": startup_profile.report()}
+
+
+# TMDb watch-provider cache statistics
+@api_router.get("/cache")
+async def cache_stats():
+    return {
+        "tmdb_providers": provider_cache.stats(),
+        "tmdb_single_flight": provider_lookups.stats(),
+        "tmdb_provider_index": await asyncio.to_thread(provider_index.stats),
+        "webhook_dedup": recent_webhooks.stats(),
+        "shared_state": await asyncio.to_thread(shared_store.stats),
+        "provider_catalog": provider_catalog.stats(),
+        "event_feed": event_feed.stats(),
+    }
+
+@api_router.delete("/cache")
+async def cache_clear():
+    provider_cache.clear()
+    title_details_cache.clear()
+    if shared_store.enabled:
+        await asyncio.to_thread(shared_store.cache_clear)
+    return {"message": "Cache cleared"}
+
+
+# Watch-provider catalog for the UI: prefix search over provider names, paginated
+@api_router.get("/providers")
+async def providers(
+    request: Request,
+    q: str = "",
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+):
+    provider_catalog.maybe_reload()
+    etag = provider_catalog.etag(q, offset, limit)
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=300", "Vary": "Accept-Encoding"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    body, encoding = provider_catalog.render(q, offset, limit, request.headers.get("accept-encoding", ""))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+
+# Webhook job queue, notification dispatcher and upstream circuit status
+@api_router.get("/queue")
+async def queue_status():
+    stats = await asyncio.to_thread(job_queue.stats)
+    stats["discord"] = dispatcher.stats()
+    stats["upstream_circuits"] = circuit_states()
+    return stats
+
+@api_router.post("/queue/retry")
+async def queue_retry_failed():
+    count = await asyncio.to_thread(job_queue.requeue_failed)
+    return {"message": f"Requeued {count} failed job(s)"}
+
+
+# Decision history, newest first; pass next_cursor back as cursor for older pages
+@api_router.get("/history")
+async def history(
+    action: Optional[str] = None,
+    source: Optional[str] = None,
+    tmdb_id: Optional[str] = None,
+    request_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[int] = None,
+):
+    return await asyncio.to_thread(
+        decision_history.query, action=action, source=source, tmdb_id=tmdb_id, request_id=request_id,
+        since=_timestamp(since), until=_timestamp(until), limit=limit, cursor=cursor,
+    )
+
+@api_router.get("/history/stats")
+async def history_stats():
+    return await asyncio.to_thread(decision_history.stats)
+
+def _timestamp(value):
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+# Live feed of decision and error events as Server-Sent Events; EventSource
+# reconnects with Last-Event-ID and gets whatever it missed from the buffer
+@api_router.get("/events")
+async def events(request: Request, backlog: int = Query(50, ge=0, le=500)):
+    if event_feed.full:
+        raise HTTPException(status_code=503, detail="Too many live feed clients")
+    last_event_id = request.headers.get("last-event-id", "")
+    return StreamingResponse(
+        stream(event_feed, int(last_event_id) if last_event_id.isdigit() else None, backlog),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Prometheus text exposition
+@machine_router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
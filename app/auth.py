@@ -1,10 +1,184 @@
-from fastapi import HTTPException, status, Request, Depends
+import time
+import hmac
+import base64
+import asyncio
+import hashlib
+import secrets
+from collections import OrderedDict, deque
+from fastapi import HTTPException, status, Request
+from app.config_server import load_config, get_config_version
 
-def verify_session(request: Request):
+# --- Password hashing ---
+# scrypt is salted and memory-hard (~16 MiB per hash with these parameters).
+# Hashes are stored as "scrypt$n$r$p$salt$digest"; bare hex digests are the
+# legacy unsalted SHA-256 format and are upgraded on the next successful login.
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_DKLEN = 32
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+def hash_password(password: str) -> str:
+    salt = secrets.token_bytes(16)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, dklen=SCRYPT_DKLEN)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+
+def verify_password(password: str, stored: str) -> bool:
+    if not stored:
+        return False
+    if stored.startswith("scrypt$"):
+        try:
+            _, n, r, p, salt, expected = stored.split("$")
+            expected = base64.b64decode(expected)
+            digest = hashlib.scrypt(
+                password.encode(), salt=base64.b64decode(salt), n=int(n), r=int(r), p=int(p), dklen=len(expected)
+            )
+        except ValueError:
+            return False
+        return hmac.compare_digest(digest, expected)
+    return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+
+def needs_rehash(stored: str) -> bool:
+    return not stored.startswith(f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
+
+# Hashing takes tens of milliseconds of CPU; keep it off the event loop
+async def hash_password_async(password: str) -> str:
+    return await asyncio.to_thread(hash_password, password)
+
+async def verify_password_async(password: str, stored: str) -> bool:
+    return await asyncio.to_thread(verify_password, password, stored)
+
+# --- Login rate limiting ---
+
+class LoginRateLimiter:
+    """
+    Allow at most `max_attempts` failed logins per key within `window`
+    seconds; further attempts are refused until the oldest failure ages
+    out. `delay` gives a softer, growing backoff instead, for keys such as
+    a username that an outsider must not be able to lock out.
+    """
+
+    def __init__(self, max_attempts=5, window=300.0, maxsize=10000, max_delay=5.0):
+        self.max_attempts = max_attempts
+        self.window = window
+        self.maxsize = maxsize
+        self.max_delay = max_delay
+        self._failures = OrderedDict()
+        self.blocked = 0
+
+    def _recent(self, key, now):
+        failures = self._failures.get(key)
+        if failures is None:
+            return None
+        while failures and now - failures[0] >= self.window:
+            failures.popleft()
+        if not failures:
+            del self._failures[key]
+            return None
+        return failures
+
+    def retry_after(self, *keys) -> float:
+        """Seconds until any of `keys` may try again, or 0 if none is locked out."""
+        now = time.monotonic()
+        wait = 0.0
+        for key in keys:
+            failures = self._recent(key, now)
+            if failures is not None and len(failures) >= self.max_attempts:
+                wait = max(wait, self.window - (now - failures[0]))
+        if wait:
+            self.blocked += 1
+        return wait
+
+    def delay(self, key) -> float:
+        """Seconds to hold a login for `key` once it has `max_attempts` recent failures, doubling per failure."""
+        failures = self._recent(key, time.monotonic())
+        if failures is None or len(failures) < self.max_attempts:
+            return 0.0
+        return min(self.max_delay, 0.25 * 2 ** (len(failures) - self.max_attempts))
+
+    def record_failure(self, *keys):
+        now = time.monotonic()
+        for key in keys:
+            failures = self._recent(key, now) or deque()
+            failures.append(now)
+            self._failures[key] = failures
+            self._failures.move_to_end(key)
+        while len(self._failures) > self.maxsize:
+            self._failures.popitem(last=False)
+
+    def reset(self, *keys):
+        for key in keys:
+            self._failures.pop(key, None)
+
+login_limiter = LoginRateLimiter()
+
+def configure_login_limiter(config):
+    login_limiter.max_attempts = int(config.get("LOGIN_MAX_ATTEMPTS", 5))
+    login_limiter.window = float(config.get("LOGIN_LOCKOUT_WINDOW", 300))
+
+# --- API keys ---
+# Machine clients (Overseerr's webhook agent, Prometheus) authenticate with
+# the API_KEY from config instead of a session cookie. Only digests are kept
+# in memory, and they are compared in constant time.
+
+_api_key_digests = ()
+_api_key_version = None
+
+def _key_digest(key: str) -> bytes:
+    return hashlib.sha256(key.encode()).digest()
+
+def _current_api_key_digests():
+    global _api_key_digests, _api_key_version
+    version = get_config_version()
+    if version != _api_key_version:
+        key = load_config().get("API_KEY") or ""
+        _api_key_digests = (_key_digest(key),) if key else ()
+        _api_key_version = version
+    return _api_key_digests
+
+def _presented_api_key(request: Request):
+    key = request.headers.get("x-api-key")
+    if key:
+        return key
+    authorization = request.headers.get("authorization")
+    if authorization:
+        scheme, _, credentials = authorization.partition(" ")
+        # Overseerr sends its "Authorization Header" field verbatim, so accept a bare key too
+        return credentials.strip() if scheme.lower() == "bearer" and credentials else authorization.strip()
+    return None
+
+def verify_api_key(request: Request) -> bool:
+    presented = _presented_api_key(request)
+    if not presented:
+        return False
+    digest = _key_digest(presented)
+    matched = False
+    for expected in _current_api_key_digests():
+        matched |= hmac.compare_digest(digest, expected)
+    return matched
+
+# --- Route dependencies ---
+
+# Admin routes (config, rules, reset, reconcile, API key rotation): a logged-in session only
+async def verify_session(request: Request):
+    user = request.session.get("user")
+    if user:
+        return user
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Not authenticated"
+    )
+
+# Machine routes (Overseerr's /webhook, /metrics scrapers): the API key, or a session
+async def verify_api_key_or_session(request: Request):
     user = request.session.get("user")
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not authenticated"
-        )
-    return user
+    if user:
+        return user
+    if verify_api_key(request):
+        return "api-key"
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Not authenticated"
+    )
@@ -1,13 +1,20 @@
 import os
 import json
+import time
 import hashlib
-import requests
+import secrets
+import tempfile
+import threading
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 from app.utils.logging import log_event
+from app.utils.http import request, get_tmdb_headers, get_overseerr_headers
+from app.utils.tmdb import TMDB_API_URL
+from app.utils.shared import FileLock
 
 # Default to Docker volume location for persisted config
 CONFIG_FILE = os.getenv("CONFIG_PATH", "/config/config.json")
+CONFIG_DIR = os.path.dirname(CONFIG_FILE)
 
 router = APIRouter()
 
@@ -24,9 +31,47 @@ DEFAULT_CONFIG = {
     "OVERSEERR_URL": "",
     "OVERSEERR_API_KEY": "",
     "DISCORD_WEBHOOK_URL": "",
-    "providers": []
+    "providers": [],
+    "TMDB_CACHE_TTL": 21600,
+    "TMDB_CACHE_NEGATIVE_TTL": 300,
+    "TMDB_CACHE_SIZE": 2048,
+    "TMDB_CACHE_PERSIST": True,
+    "WEBHOOK_DEDUP_WINDOW": 60,
+    "WEBHOOK_WORKERS": 4,
+    "JOB_MAX_ATTEMPTS": 5,
+    "JOB_RETRY_BACKOFF": 5,
+    "JOB_LEASE_TIMEOUT": 300,
+    "RECONCILE_INTERVAL": 0,
+    "RECONCILE_DRY_RUN": False,
+    "RECONCILE_CONCURRENCY": 8,
+    "RECONCILE_BATCH_SIZE": 50,
+    "DISCORD_BATCH_WINDOW": 2,
+    "PROVIDER_INDEX_ENABLED": False,
+    "PROVIDER_INDEX_REFRESH_INTERVAL": 360,
+    "PROVIDER_INDEX_MAX_AGE": 168,
+    "PROVIDER_CATALOG_REFRESH_INTERVAL": 24,
+    "REGIONS": ["US"],
+    "MONETIZATION_TYPES": ["flatrate"],
+    "HTTP_RETRIES": 2,
+    "HTTP_HEDGE_DELAY": 2,
+    "CIRCUIT_FAILURE_THRESHOLD": 5,
+    "CIRCUIT_RESET_TIMEOUT": 30,
+    "HISTORY_RETENTION_DAYS": 90,
+    "API_KEY": "",
+    "LOGIN_MAX_ATTEMPTS": 5,
+    "LOGIN_LOCKOUT_WINDOW": 300,
+    "STARTUP_BUDGET_MS": 2000,
+    "HEALTH_PROBE_INTERVAL": 60,
+    "HEALTH_PROBE_TIMEOUT": 5,
+    "RULES": [],
+    "EVENT_FEED_SIZE": 500,
+    "EVENT_FEED_CLIENT_QUEUE": 100,
+    "EVENT_FEED_MAX_CLIENTS": 20
 }
 
+# Defaults that _validate_config must not fill into an existing config
+CREDENTIAL_KEYS = frozenset({"username", "password", "require_password_change"})
+
 # Incoming config structure
 class EnvConfig(BaseModel):
     TMDB_API_KEY: str
@@ -35,36 +80,158 @@ class EnvConfig(BaseModel):
     DISCORD_WEBHOOK_URL: str
     PROVIDERS: list[str] = []
 
-# Load config file or initialize default
-def load_config():
-    config_dir = os.path.dirname(CONFIG_FILE)
-    if not os.path.exists(config_dir):
-        os.makedirs(config_dir, exist_ok=True)
+# --- Config snapshot cache ---
+# The parsed config is kept in memory and only re-read when save_config writes
+# or the file's mtime changes. The mtime is checked at most once per
+# CONFIG_STAT_INTERVAL seconds, so hot paths normally do no filesystem calls.
+CONFIG_STAT_INTERVAL = float(os.getenv("CONFIG_STAT_INTERVAL", "2.0"))
+
+_config_lock = threading.Lock()
+# Serializes writers across worker processes; readers rely on atomic rename
+_config_file_lock = FileLock(os.path.join(CONFIG_DIR, ".config.lock"))
+_snapshot = None
+_snapshot_mtime = None
+_last_stat = 0.0
+_config_version = 0
+_config_listeners = []
+
+def _validate_config(raw) -> dict:
+    if not isinstance(raw, dict):
+        raise ValueError("config root must be a JSON object")
+    # Credentials are only seeded when the file is first created: a config
+    # written without them must not fall back to admin/admin
+    config = {k: v for k, v in DEFAULT_CONFIG.items() if k not in CREDENTIAL_KEYS}
+    config.update(raw)
+    if not isinstance(config.get("PROVIDERS", []), list):
+        config["PROVIDERS"] = []
+    if not isinstance(config.get("RULES", []), list):
+        config["RULES"] = []
+    return config
+
+def _set_snapshot(config: dict, mtime):
+    global _snapshot, _snapshot_mtime, _last_stat, _config_version
+    _snapshot = config
+    _snapshot_mtime = mtime
+    _last_stat = time.monotonic()
+    _config_version += 1
+    for listener in _config_listeners:
+        try:
+            listener(dict(config))
+        except Exception as e:
+            log_event("config_listener_error", listener=getattr(listener, "__name__", repr(listener)), error=str(e))
+
+# Called with every new config snapshot, whether saved here or picked up from disk
+def add_config_listener(listener):
+    if listener not in _config_listeners:
+        _config_listeners.append(listener)
+
+def _write_atomic(cfg: dict):
+    config_dir = os.path.dirname(CONFIG_FILE) or "."
+    os.makedirs(config_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=config_dir, prefix=".config.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(cfg, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.isfile(CONFIG_FILE):
+            os.chmod(tmp_path, os.stat(CONFIG_FILE).st_mode & 0o777)
+        os.replace(tmp_path, CONFIG_FILE)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return os.stat(CONFIG_FILE).st_mtime_ns
+
+def _reload_config():
+    global _last_stat
+    try:
+        mtime = os.stat(CONFIG_FILE).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    except IsADirectoryError:
+        mtime = None
 
-    if not os.path.exists(CONFIG_FILE) or os.path.isdir(CONFIG_FILE):
-        with open(CONFIG_FILE, "w") as f:
-            json.dump(DEFAULT_CONFIG, f, indent=2)
-        return DEFAULT_CONFIG
+    if mtime is None or os.path.isdir(CONFIG_FILE):
+        with _config_file_lock:
+            # Another worker may have created it while we waited for the lock
+            if not os.path.isfile(CONFIG_FILE):
+                _set_snapshot(dict(DEFAULT_CONFIG), _write_atomic(DEFAULT_CONFIG))
+                return
+        mtime = os.stat(CONFIG_FILE).st_mtime_ns
+
+    if _snapshot is not None and mtime == _snapshot_mtime:
+        _last_stat = time.monotonic()
+        return
 
     try:
         with open(CONFIG_FILE, "r") as f:
-            return json.load(f)
+            _set_snapshot(_validate_config(json.load(f)), mtime)
+        log_event("config_reloaded", version=_config_version)
     except Exception as e:
         log_event("config_load_error", error=str(e))
-        return {}
+        # Keep serving the last good snapshot until the file is fixed
+        _last_stat = time.monotonic()
+
+# Load config from the in-memory snapshot, initializing defaults on first use
+def load_config():
+    if _snapshot is None or time.monotonic() - _last_stat >= CONFIG_STAT_INTERVAL:
+        with _config_lock:
+            _reload_config()
+    return dict(_snapshot) if _snapshot is not None else {}
+
+# Incremented every time the snapshot changes; lets callers rebuild derived state
+def get_config_version() -> int:
+    load_config()
+    return _config_version
 
-# Save new config to file
+# Force the next load_config to re-read the file (e.g. after a reset deletes it)
+def invalidate_config():
+    global _snapshot_mtime, _last_stat
+    with _config_lock:
+        _snapshot_mtime = None
+        _last_stat = 0.0
+
+# Save new config to file (write-then-rename) and refresh the snapshot
 def save_config(cfg: dict):
     try:
-       # if "password" in cfg:
-       #     cfg["password"] = hash_value(cfg["password"])
+        with _config_lock, _config_file_lock:
+            mtime = _write_atomic(cfg)
+            _set_snapshot(_validate_config(dict(cfg)), mtime)
+    except Exception as e:
+        log_event("config_save_error", error=str(e))
+        raise HTTPException(status_code=500, detail="Failed to save configuration")
 
-        with open(CONFIG_FILE, "w") as f:
-            json.dump(cfg, f, indent=2)
+# Apply `changes` on top of the config currently on disk, holding the file lock
+# across the read and the write so concurrent updates from other workers aren't lost
+def merge_config(changes: dict) -> dict:
+    try:
+        with _config_lock, _config_file_lock:
+            config = {**_read_current(), **changes}
+            mtime = _write_atomic(config)
+            _set_snapshot(_validate_config(dict(config)), mtime)
+            return dict(config)
     except Exception as e:
         log_event("config_save_error", error=str(e))
         raise HTTPException(status_code=500, detail="Failed to save configuration")
 
+def _read_current() -> dict:
+    try:
+        with open(CONFIG_FILE, "r") as f:
+            return _validate_config(json.load(f))
+    except FileNotFoundError:
+        return dict(DEFAULT_CONFIG)
+    except (OSError, ValueError):
+        # Unreadable on disk: build on the last good snapshot rather than on defaults
+        return dict(_snapshot) if _snapshot is not None else dict(DEFAULT_CONFIG)
+
+# Delete the config file so defaults are recreated on next load
+def remove_config():
+    with _config_lock, _config_file_lock:
+        if os.path.exists(CONFIG_FILE):
+            os.remove(CONFIG_FILE)
+    invalidate_config()
+
 # --- API Routes ---
 
 @router.get("")
@@ -75,26 +242,36 @@ def get_config():
 
 @router.post("")
 def update_config(cfg: EnvConfig):
-    config = load_config()
-    config.update(cfg.dict())
-    save_config(config)
+    merge_config(cfg.dict())
     log_event("config_updated", updated_keys=list(cfg.dict().keys()))
     return {"message": "Configuration updated successfully"}
 
+# Issue a new API key for machine clients (Overseerr webhook, metrics scrapers); the old one stops working
+@router.post("/api-key")
+def regenerate_api_key():
+    key = secrets.token_urlsafe(32)
+    merge_config({"API_KEY": key})
+    log_event("api_key_regenerated")
+    return {"api_key": key}
+
 @router.get("/test/tmdb")
-def test_tmdb(key: str = Query(None)):
+async def test_tmdb(key: str = Query(None)):
     api_key = key or load_config().get("TMDB_API_KEY")
     if not api_key:
         raise HTTPException(status_code=400, detail="TMDB_API_KEY missing")
 
-    url = "https://api.themoviedb.org/3/authentication"
-    headers = {"Authorization": f"Bearer {api_key}", "accept": "application/json"}
-    r = requests.get(url, headers=headers, timeout=10)
-    log_event("test_tmdb", status=r.status_code)
-    return {"success": r.status_code == 200}
+    url = f"{TMDB_API_URL}/authentication"
+    headers = {**get_tmdb_headers(api_key), "accept": "application/json"}
+    try:
+        r = await request("GET", url, headers=headers, retries=0, hedge=False)
+        log_event("test_tmdb", status=r.status_code)
+        return {"success": r.status_code == 200}
+    except Exception as e:
+        log_event("test_tmdb_failed", error=str(e))
+        return {"success": False}
 
 @router.get("/test/overseerr")
-def test_overseerr(url: str = Query(None), key: str = Query(None)):
+async def test_overseerr(url: str = Query(None), key: str = Query(None)):
     cfg = load_config()
     test_url = url or cfg.get("OVERSEERR_URL")
     api_key = key or cfg.get("OVERSEERR_API_KEY")
@@ -104,9 +281,8 @@ def test_overseerr(url: str = Query(None), key: str = Query(None)):
     if not api_key:
         raise HTTPException(status_code=400, detail="Overseerr API Key missing")
 
-    headers = {"X-Api-Key": api_key}
     try:
-        resp = requests.get(f"{test_url}/api/v1/user", headers=headers, timeout=10)
+        resp = await request("GET", f"{test_url}/api/v1/user", headers=get_overseerr_headers(api_key), retries=0, hedge=False)
         log_event("test_overseerr", url=test_url, status=resp.status_code)
         return {"success": resp.status_code == 200}
     except Exception as e:
@@ -114,14 +290,14 @@ def test_overseerr(url: str = Query(None), key: str = Query(None)):
         return {"success": False}
 
 @router.get("/test/discord")
-def test_discord(url: str = Query(None)):
+async def test_discord(url: str = Query(None)):
     webhook = url or load_config().get("DISCORD_WEBHOOK_URL")
     if not webhook:
         raise HTTPException(status_code=400, detail="Discord webhook URL missing")
 
     data = {"content": "✅ Discord webhook test successful."}
     try:
-        r = requests.post(webhook, json=data, timeout=10)
+        r = await request("POST", webhook, json=data)
         log_event("test_discord", status=r.status_code)
         return {"success": r.status_code in [200, 204]}
     except Exception as e:
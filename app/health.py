@@ -0,0 +1,150 @@
+import time
+import sqlite3
+import asyncio
+import httpx
+from fastapi import APIRouter, Response
+from app.config_server import load_config
+from app.utils.http import request, get_tmdb_headers, get_overseerr_headers
+from app.utils.logging import log_event
+from app.utils.shared import shared_store
+from app.utils.startup import startup_profile
+from app.utils.tmdb import TMDB_API_URL, provider_cache
+from app import webhook
+
+# Unauthenticated: polled by Docker / orchestrators, so nothing here may
+# reach an upstream or wait on one
+router = APIRouter()
+
+class UpstreamProbes:
+    """
+    Reachability of TMDb, Overseerr and Discord, checked by a background
+    task every `interval` seconds. Readers only see the cached results.
+    With several workers, the leader publishes its results to the shared
+    store and the other workers read them from there.
+    """
+
+    SHARED_KEY = "health:upstreams"
+
+    def __init__(self, interval=60.0, timeout=5.0):
+        self.interval = interval
+        self.timeout = timeout
+        self.results = {}
+        self._task = None
+
+    @staticmethod
+    def targets(config):
+        """(method, url, headers) per upstream, or None if it isn't configured. None of these has side effects."""
+        tmdb_key = config.get("TMDB_API_KEY")
+        overseerr_url = (config.get("OVERSEERR_URL") or "").rstrip("/")
+        overseerr_key = config.get("OVERSEERR_API_KEY")
+        discord = config.get("DISCORD_WEBHOOK_URL")
+        return {
+            "tmdb": ("GET", f"{TMDB_API_URL}/authentication", get_tmdb_headers(tmdb_key)) if tmdb_key else None,
+            "overseerr": (
+                ("GET", f"{overseerr_url}/api/v1/auth/me", get_overseerr_headers(overseerr_key))
+                if overseerr_url and overseerr_key else None
+            ),
+            # GET on a Discord webhook returns its metadata without posting anything
+            "discord": ("GET", discord, {}) if discord else None,
+        }
+
+    async def probe(self, method, url, headers):
+        start = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(
+                request(method, url, headers=headers, retries=0, hedge=False), self.timeout
+            )
+            result = {"status": "up" if response.is_success else "down", "http_status": response.status_code}
+        except (httpx.HTTPError, asyncio.TimeoutError) as e:
+            # Only the exception type: this ends up on an unauthenticated endpoint
+            result = {"status": "down", "error": type(e).__name__}
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        result["checked_at"] = time.time()
+        return result
+
+    async def run_once(self, config):
+        targets = self.targets(config)
+
+        async def check(target):
+            return await self.probe(*target) if target else {"status": "unconfigured", "checked_at": time.time()}
+
+        results = dict(zip(targets, await asyncio.gather(*(check(t) for t in targets.values()))))
+        for name, result in results.items():
+            previous = self.results.get(name, {}).get("status")
+            if previous is not None and previous != result["status"]:
+                log_event("upstream_health_changed", upstream=name, previous=previous, **result)
+        self.results = results
+        if shared_store.enabled:
+            await asyncio.to_thread(shared_store.cache_set, self.SHARED_KEY, results, self.interval * 3)
+        return results
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once(load_config())
+            except Exception as e:
+                log_event("upstream_probe_error", error=str(e))
+            await asyncio.sleep(self.interval)
+
+    def start(self, config):
+        self.interval = float(config.get("HEALTH_PROBE_INTERVAL", 60))
+        self.timeout = float(config.get("HEALTH_PROBE_TIMEOUT", 5))
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def snapshot(self):
+        if self._task is None and shared_store.enabled:
+            cached = await asyncio.to_thread(shared_store.cache_get, self.SHARED_KEY)
+            return cached[0] if cached else {}
+        return self.results
+
+upstream_probes = UpstreamProbes()
+
+# Liveness: the process is up and its event loop is answering
+@router.get("/livez")
+async def livez():
+    return {"status": "ok"}
+
+# Readiness: warmed up, queue readable and workers running. Upstream
+# outages make the status "degraded" but don't fail readiness, because
+# webhooks are still accepted and retried from the queue.
+@router.get("/readyz")
+async def readyz(response: Response):
+    ready = startup_profile.ready
+    try:
+        queue = await asyncio.to_thread(webhook.job_queue.stats, 0)
+        queue.pop("failed_jobs", None)
+    except sqlite3.Error as e:
+        ready = False
+        queue = {"error": type(e).__name__}
+    workers_running = webhook.worker_pool is not None and webhook.worker_pool.running
+    ready = ready and workers_running
+
+    upstreams = await upstream_probes.snapshot()
+    if not startup_profile.ready:
+        status = "warming"
+    elif not ready:
+        status = "unavailable"
+    elif any(result["status"] == "down" for result in upstreams.values()):
+        status = "degraded"
+    else:
+        status = "ready"
+    if not ready:
+        response.status_code = 503
+
+    cache = provider_cache.stats()
+    return {
+        "status": status,
+        "queue": queue,
+        "workers_running": workers_running,
+        "cache": {
+            "tmdb_providers": {"size": cache["size"], "hit_ratio": cache["hit_ratio"]},
+            "shared_state": shared_store.enabled,
+        },
+        "upstreams": upstreams,
+    }
@@ -0,0 +1,179 @@
+import os
+import time
+import asyncio
+from collections import Counter
+from fastapi import APIRouter, HTTPException, Query
+from app.config_server import load_config, CONFIG_DIR
+from app.utils.logging import log_event
+from app.utils.overseerr import list_requests
+from app.utils.discord import send_reconcile_summary
+from app.utils.shared import SHARED_STATE, FileLock
+from app.webhook import get_required_config, evaluate_request, apply_action, decision_history
+
+router = APIRouter()
+
+# Overseerr request status -> webhook status code used by decide_action
+OVERSEERR_STATUS = {1: 2, 2: 1}
+OVERSEERR_STATUS_NAME = {1: "pending", 2: "approved"}
+# Overseerr media status: 4 = partially available, 5 = available. Approved
+# requests for media that has already been downloaded stay "approved" forever
+AVAILABLE_MEDIA_STATUS = {4, 5}
+
+class SweepInProgress(Exception):
+    pass
+
+_sweep_lock = asyncio.Lock()
+# Held for the duration of a sweep so only one worker process sweeps at a time
+_sweep_file_lock = FileLock(os.path.join(CONFIG_DIR, ".reconcile.lock"))
+_last_report = None
+_scheduler = None
+
+async def _evaluate(config, request, semaphore):
+    media = request.get("media") or {}
+    requested_by = request.get("requestedBy") or {}
+    item = {
+        "request_id": request.get("id"),
+        "tmdb_id": media.get("tmdbId"),
+        "media_type": media.get("mediaType") or request.get("type"),
+        "status": OVERSEERR_STATUS_NAME[request["status"]],
+    }
+    if not all([item["request_id"], item["tmdb_id"], item["media_type"]]):
+        item["action"] = "skipped"
+        return item
+    if request["status"] == 2 and media.get("status") in AVAILABLE_MEDIA_STATUS:
+        # Already fulfilled and in the library: the webhook would never have touched it
+        item["action"] = "skipped"
+        item["reason"] = "already available"
+        return item
+
+    async with semaphore:
+        decision = await evaluate_request(
+            config, item["tmdb_id"], item["media_type"], OVERSEERR_STATUS[request["status"]],
+            requested_by=[requested_by.get("username"), requested_by.get("plexUsername"), requested_by.get("email")],
+        )
+    item["action"] = decision["action"]
+    item["rule"] = decision["rule"]
+    item["matched_providers"] = sorted(decision["matched"])
+    item["unmatched_providers"] = sorted(decision["unmatched"])
+    item["latency_ms"] = decision["latency_ms"]
+    return item
+
+async def _apply(config, item, semaphore):
+    async with semaphore:
+        item["applied"] = await apply_action(config, item["action"], item["request_id"])
+    decision_history.record(
+        "reconcile", item["action"] if item["applied"] else "errored",
+        request_id=item["request_id"], tmdb_id=item["tmdb_id"], media_type=item["media_type"],
+        status=1 if item["status"] == "approved" else 2,
+        matched=item["matched_providers"], unmatched=item["unmatched_providers"], latency_ms=item["latency_ms"],
+        error=None if item["applied"] else f"Could not apply '{item['action']}'",
+    )
+
+async def run_sweep(dry_run=True):
+    """
+    Evaluate every pending and approved Overseerr request with the same
+    decision logic as the webhook and, unless `dry_run`, apply the results.
+    Approved requests whose media is already (partially) available are
+    reported as skipped and never deleted. Manual-review outcomes are
+    reported but never notified individually.
+    """
+    if _sweep_lock.locked():
+        raise SweepInProgress("A reconciliation sweep is already running")
+
+    async with _sweep_lock:
+        if SHARED_STATE and not _sweep_file_lock.acquire(blocking=False):
+            raise SweepInProgress("A reconciliation sweep is already running in another worker")
+        try:
+            return await _sweep(dry_run)
+        finally:
+            _sweep_file_lock.release()
+
+async def _sweep(dry_run):
+    global _last_report
+    started = time.monotonic()
+    config = get_required_config()
+    concurrency = int(config.get("RECONCILE_CONCURRENCY", 8))
+    batch_size = int(config.get("RECONCILE_BATCH_SIZE", 50))
+    semaphore = asyncio.Semaphore(concurrency)
+    log_event("reconcile_started", dry_run=dry_run)
+
+    requests = []
+    for request_filter in ("pending", "approved"):
+        requests.extend(await list_requests(config, request_filter))
+    requests = [r for r in requests if r.get("status") in OVERSEERR_STATUS]
+
+    results = await asyncio.gather(
+        *[_evaluate(config, r, semaphore) for r in requests], return_exceptions=True
+    )
+    items, errors = [], []
+    for request, result in zip(requests, results):
+        if isinstance(result, Exception):
+            errors.append({"request_id": request.get("id"), "error": str(result)})
+        else:
+            items.append(result)
+
+    actionable = [i for i in items if i["action"] in ("deleted", "declined", "approved")]
+    if not dry_run:
+        for start in range(0, len(actionable), batch_size):
+            batch = actionable[start:start + batch_size]
+            await asyncio.gather(*[_apply(config, i, semaphore) for i in batch])
+            log_event("reconcile_batch_applied", batch=start // batch_size + 1, size=len(batch))
+
+    counts = Counter(i["action"] for i in items)
+    failed = [i["request_id"] for i in actionable if i.get("applied") is False]
+    report = {
+        "dry_run": dry_run,
+        "scanned": len(requests),
+        "actions": dict(counts),
+        "failed": failed,
+        "errors": errors,
+        "duration_seconds": round(time.monotonic() - started, 2),
+        "finished_at": time.time(),
+        "items": items,
+    }
+    _last_report = report
+    log_event("reconcile_finished", dry_run=dry_run, scanned=len(requests), actions=dict(counts),
+              failed=len(failed), errors=len(errors), duration=report["duration_seconds"])
+
+    if not dry_run and actionable:
+        send_reconcile_summary(config, {a: n for a, n in counts.items() if a != "review"})
+    return report
+
+async def _schedule_loop():
+    while True:
+        interval = float(load_config().get("RECONCILE_INTERVAL", 0))
+        if interval <= 0:
+            await asyncio.sleep(60)
+            continue
+        await asyncio.sleep(interval * 60)
+        try:
+            await run_sweep(dry_run=bool(load_config().get("RECONCILE_DRY_RUN", False)))
+        except Exception as e:
+            log_event("reconcile_error", error=str(e))
+
+def start_scheduler():
+    global _scheduler
+    _scheduler = asyncio.create_task(_schedule_loop())
+
+async def stop_scheduler():
+    if _scheduler is not None:
+        _scheduler.cancel()
+        await asyncio.gather(_scheduler, return_exceptions=True)
+
+@router.post("")
+async def reconcile(dry_run: bool = Query(True)):
+    try:
+        return await run_sweep(dry_run=dry_run)
+    except SweepInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except EnvironmentError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log_event("reconcile_error", error=str(e))
+        raise HTTPException(status_code=502, detail=str(e))
+
+@router.get("")
+async def last_reconcile_report():
+    if _last_report is None:
+        raise HTTPException(status_code=404, detail="No reconciliation has run yet")
+    return _last_report
@@ -0,0 +1,124 @@
+import time
+import asyncio
+from typing import Literal, Optional, Union
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+from app.config_server import load_config, merge_config
+from app.utils.logging import log_event
+from app.utils.rules import RuleError, Facts, STATUS_NAMES, compile_rules
+from app.utils.tmdb import (
+    get_availability, get_title_details, get_regions, get_monetization_types, select_providers, ProviderLookupError
+)
+from app.webhook import get_provider_matcher, get_rules, decide_action
+
+router = APIRouter()
+
+class RulesUpdate(BaseModel):
+    rules: list[dict]
+
+class SampleTitle(BaseModel):
+    tmdb_id: Union[int, str]
+    media_type: Literal["movie", "tv"]
+    status: Literal["pending", "approved"] = "pending"
+    requested_by: list[str] = []
+
+class RulesTest(BaseModel):
+    titles: list[SampleTitle] = Field(..., min_length=1, max_length=200)
+    # Unsaved rules to try out; the saved RULES are used when omitted
+    rules: Optional[list[dict]] = None
+
+def _compile(raw_rules, config):
+    try:
+        return compile_rules(raw_rules, get_provider_matcher(), get_regions(config))
+    except RuleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("")
+async def list_rules():
+    rules = get_rules()
+    return {
+        "rules": load_config().get("RULES", []),
+        "compiled": len(rules),
+        "needs_title_details": rules.needs_details,
+    }
+
+@router.put("")
+async def update_rules(body: RulesUpdate):
+    # Refuse to save anything that wouldn't compile
+    _compile(body.rules, load_config())
+    merge_config({"RULES": body.rules})
+    log_event("rules_updated", count=len(body.rules))
+    return {"message": f"Saved {len(body.rules)} rule(s)"}
+
+@router.post("/test")
+async def test_rules(body: RulesTest):
+    """
+    Evaluate sample titles against the saved or supplied rules. Every rule
+    is run on every title, not just up to the first match, so the timings
+    cover the whole rule list.
+    """
+    config = load_config()
+    if not config.get("TMDB_API_KEY"):
+        raise HTTPException(status_code=400, detail="TMDB_API_KEY missing")
+
+    started = time.perf_counter()
+    rules = get_rules() if body.rules is None else _compile(body.rules, config)
+    compile_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    regions = get_regions(config)
+    monetization_types = get_monetization_types(config)
+    semaphore = asyncio.Semaphore(int(config.get("RECONCILE_CONCURRENCY", 8)))
+
+    async def lookup(title):
+        async with semaphore:
+            availability = await get_availability(config, title.tmdb_id, title.media_type)
+            details = await get_title_details(config, title.tmdb_id, title.media_type) if rules.needs_details else None
+        return availability, details
+
+    lookups = await asyncio.gather(*(lookup(title) for title in body.titles), return_exceptions=True)
+
+    timings = [
+        {"name": rule.name, "action": rule.action, "matched": 0, "decided": 0, "total_us": 0.0, "max_us": 0.0}
+        for rule in rules.rules
+    ]
+    results = []
+    evaluated = 0
+    for title, outcome in zip(body.titles, lookups):
+        item = {"tmdb_id": title.tmdb_id, "media_type": title.media_type, "status": title.status}
+        results.append(item)
+        if isinstance(outcome, ProviderLookupError):
+            item["error"] = str(outcome)
+            continue
+        if isinstance(outcome, BaseException):
+            raise outcome
+        availability, details = outcome
+        status = STATUS_NAMES[title.status]
+        facts = Facts(title.media_type, status, title.requested_by, availability, monetization_types, details)
+
+        decided = None
+        for position, (rule, matched, elapsed_us) in enumerate(rules.explain(facts)):
+            timing = timings[position]
+            timing["total_us"] += elapsed_us
+            timing["max_us"] = max(timing["max_us"], elapsed_us)
+            if matched:
+                timing["matched"] += 1
+                if decided is None:
+                    decided = rule
+                    timing["decided"] += 1
+        evaluated += 1
+
+        matched, _ = get_provider_matcher().match(select_providers(availability, regions, monetization_types))
+        item.update({
+            "action": decided.decide(status) if decided else decide_action(status, matched),
+            "rule": decided.name if decided else None,
+            "matched_providers": sorted(matched),
+        })
+        if details is not None:
+            item["details"] = details
+
+    for timing in timings:
+        timing["mean_us"] = round(timing["total_us"] / evaluated, 2) if evaluated else None
+        timing["total_us"] = round(timing["total_us"], 2)
+        timing["max_us"] = round(timing["max_us"], 2)
+
+    return {"compile_ms": compile_ms, "evaluated": evaluated, "rules": timings, "results": results}
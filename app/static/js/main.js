@@ -1,6 +1,10 @@
 let selectedProviders = [];
 let allProviders = [];
 let sortOrder = [];
+const PROVIDER_PAGE_SIZE = 120;
+let providerTotal = 0;
+let providerRequest = 0;
+let providerSearchTimer = null;
 
 function toggleTheme() {
   document.documentElement.classList.toggle("dark");
@@ -58,15 +62,15 @@ function updateSelectedList() {
   });
 }
 
-function renderProviders(filter = "") {
+// allProviders holds the pages loaded for the current search; /providers
+// already returns them filtered and ordered by TMDb display priority
+function renderProviders() {
   const container = document.getElementById("providerCheckboxes");
   container.innerHTML = "";
 
-  let providersToShow = allProviders.filter(p => p.name && p.name.toLowerCase().includes(filter.toLowerCase()));
+  const providersToShow = [...allProviders];
   if (sortOrder.length) {
     providersToShow.sort((a, b) => sortOrder.indexOf(a.name) - sortOrder.indexOf(b.name));
-  } else {
-    providersToShow.sort((a, b) => (b.popularity || 0) - (a.popularity || 0));
   }
 
   providersToShow.forEach(provider => {
@@ -113,23 +117,31 @@ function renderProviders(filter = "") {
 }
 
 function filterProviders() {
-  const filter = document.getElementById("providerSearch");
-  if (filter) renderProviders(filter.value);
+  clearTimeout(providerSearchTimer);
+  providerSearchTimer = setTimeout(() => loadProviderList(), 200);
 }
 
-async function loadProviderList() {
+async function loadProviderList(more = false) {
+  const query = document.getElementById("providerSearch")?.value.trim() || "";
+  const offset = more ? allProviders.length : 0;
+  const params = new URLSearchParams({ q: query, offset, limit: PROVIDER_PAGE_SIZE });
+  // Drop responses to searches the user has already typed past
+  const requestId = ++providerRequest;
   try {
-    const res = await fetch("/static/providers.json");
+    const res = await fetch(`/providers?${params}`);
     if (!res.ok) throw new Error(`HTTP ${res.status} - ${res.statusText}`);
-    const json = await res.json();
-    if (!Array.isArray(json)) throw new Error("Provider data is not an array");
-    allProviders = json;
+    const page = await res.json();
+    if (requestId !== providerRequest) return;
+    if (!Array.isArray(page.items)) throw new Error("Provider data is not an array");
+    allProviders = more ? allProviders.concat(page.items) : page.items;
+    providerTotal = page.total;
     const savedOrder = localStorage.getItem("sortOrder");
     if (savedOrder) sortOrder = JSON.parse(savedOrder);
     renderProviders();
+    document.getElementById("providersMore").classList.toggle("hidden", allProviders.length >= providerTotal);
   } catch (err) {
     console.error("Failed to load provider list:", err);
-    allProviders = [];
+    if (!more) allProviders = [];
   }
 }
 
@@ -141,6 +153,7 @@ async function loadConfig() {
     document.getElementById("overseerrUrl").value = data.OVERSEERR_URL || "";
     document.getElementById("overseerrKey").value = data.OVERSEERR_API_KEY || "";
     document.getElementById("discord").value = data.DISCORD_WEBHOOK_URL || "";
+    document.getElementById("apiKey").value = data.API_KEY || "";
     selectedProviders = data.PROVIDERS || [];
     renderProviders();
   } catch (err) {
@@ -171,6 +184,20 @@ async function saveConfig() {
   }
 }
 
+async function regenerateApiKey() {
+  if (document.getElementById("apiKey").value && !confirm("Replace the current API key? Clients using it will stop working.")) return;
+  try {
+    const res = await fetch("/config/api-key", { method: "POST" });
+    if (!res.ok) throw new Error(`HTTP ${res.status} - ${res.statusText}`);
+    const data = await res.json();
+    document.getElementById("apiKey").value = data.api_key;
+    showToast("New API key generated.");
+  } catch (err) {
+    console.error("Failed to generate API key:", err);
+    showToast("Failed to generate API key.", true);
+  }
+}
+
 async function testTMDB() {
   const key = document.getElementById("tmdb").value;
   try {
@@ -214,9 +241,124 @@ async function testDiscord() {
   }
 }
 
+let historyCursor = null;
+
+function renderHistoryRow(item) {
+  const row = document.createElement("tr");
+  row.className = "border-b border-gray-200 dark:border-gray-800";
+  const latency = Object.values(item.latency_ms || {}).reduce((sum, ms) => sum + ms, 0);
+  const cells = [
+    new Date(item.created_at * 1000).toLocaleString(),
+    item.title || `TMDb ${item.tmdb_id}`,
+    `#${item.request_id}${item.source === "reconcile" ? " (sweep)" : ""}`,
+    item.action,
+    item.matched.length ? item.matched.join(", ") : (item.error || "—"),
+    latency ? `${latency.toFixed(0)} ms` : "—",
+  ];
+  cells.forEach(text => {
+    const td = document.createElement("td");
+    td.textContent = text;
+    td.className = "py-2 pr-4";
+    row.appendChild(td);
+  });
+  return row;
+}
+
+async function loadHistory(older = false) {
+  const params = new URLSearchParams({ limit: 25 });
+  const action = document.getElementById("historyAction").value;
+  const tmdbId = document.getElementById("historyTmdb").value.trim();
+  if (action) params.set("action", action);
+  if (tmdbId) params.set("tmdb_id", tmdbId);
+  if (older && historyCursor) params.set("cursor", historyCursor);
+
+  try {
+    const res = await fetch(`/history?${params}`);
+    if (!res.ok) throw new Error(`HTTP ${res.status} - ${res.statusText}`);
+    const page = await res.json();
+    const rows = document.getElementById("historyRows");
+    if (!older) rows.innerHTML = "";
+    page.items.forEach(item => rows.appendChild(renderHistoryRow(item)));
+    historyCursor = page.next_cursor;
+    document.getElementById("historyMore").classList.toggle("hidden", !historyCursor);
+    document.getElementById("historyEmpty").classList.toggle("hidden", rows.children.length > 0);
+  } catch (err) {
+    console.error("Failed to load decision history:", err);
+  }
+}
+
+// --- Live event feed (Server-Sent Events from /events) ---
+const EVENT_FEED_MAX_ROWS = 200;
+let eventFeedPaused = false;
+
+function describeEvent(data) {
+  const parts = [];
+  if (data.title) parts.push(data.title);
+  if (data.request_id) parts.push(`#${data.request_id}`);
+  if (data.action) parts.push(data.action);
+  if (data.rule) parts.push(`rule: ${data.rule}`);
+  if (data.upstream || data.host) parts.push(data.upstream || data.host);
+  if (data.status && !data.action) parts.push(data.status);
+  if (data.error) parts.push(data.error);
+  return parts.join(" · ");
+}
+
+function appendEventRow(name, text, level = "INFO", time = Date.now() / 1000) {
+  const list = document.getElementById("eventList");
+  const li = document.createElement("li");
+  const isProblem = level === "WARNING" || level === "ERROR" || /_(error|failed)$/.test(name);
+  li.className = `py-1 flex gap-3 ${isProblem ? "text-red-600 dark:text-red-400" : ""}`;
+
+  const when = document.createElement("span");
+  when.className = "text-gray-500 whitespace-nowrap";
+  when.textContent = new Date(time * 1000).toLocaleTimeString();
+  const label = document.createElement("span");
+  label.className = "font-semibold whitespace-nowrap";
+  label.textContent = name;
+  const detail = document.createElement("span");
+  detail.className = "truncate";
+  detail.textContent = text;
+
+  li.append(when, label, detail);
+  list.prepend(li);
+  while (list.children.length > EVENT_FEED_MAX_ROWS) list.lastChild.remove();
+  document.getElementById("eventEmpty").classList.add("hidden");
+}
+
+function startEventFeed() {
+  const status = document.getElementById("eventStatus");
+  // EventSource reconnects by itself and resumes from the last event id
+  const source = new EventSource("/events");
+  source.onopen = () => { status.textContent = "Live"; };
+  source.onerror = () => { status.textContent = "Reconnecting…"; };
+  source.onmessage = (e) => {
+    if (eventFeedPaused) return;
+    const entry = JSON.parse(e.data);
+    appendEventRow(entry.event, describeEvent(entry.data || {}), entry.level, entry.time);
+  };
+  source.addEventListener("dropped", (e) => {
+    const { count } = JSON.parse(e.data);
+    appendEventRow("skipped", `${count} event(s) missed while this tab was falling behind`, "WARNING");
+  });
+}
+
+function toggleEventFeed() {
+  eventFeedPaused = !eventFeedPaused;
+  document.getElementById("eventPause").textContent = eventFeedPaused ? "Resume" : "Pause";
+  document.getElementById("eventStatus").textContent = eventFeedPaused ? "Paused" : "Live";
+}
+
+function clearEventFeed() {
+  document.getElementById("eventList").innerHTML = "";
+  document.getElementById("eventEmpty").classList.remove("hidden");
+}
+
 window.addEventListener("DOMContentLoaded", () => {
   loadProviderList();
   loadConfig();
+  loadHistory();
+  startEventFeed();
+  document.getElementById("historyAction")?.addEventListener("change", () => loadHistory());
   document.getElementById("providerSearch")?.addEventListener("input", filterProviders);
 
   const tmdbBtn = document.querySelector("button[onclick='testTMDB()']");
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import tempfile
+from collections import OrderedDict
+from app.utils.logging import log_event
+
+MISSING = object()
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries each carry their own expiry.
+
+    Keys must be tuples of JSON-serializable values so the cache can be
+    persisted to a small JSON file and restored on startup.
+    """
+
+    def __init__(self, maxsize=1024, path=None, save_interval=300):
+        self.maxsize = maxsize
+        self.path = path
+        self.save_interval = save_interval
+        self._data = OrderedDict()
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def configure(self, maxsize=None, path=MISSING):
+        if maxsize is not None:
+            self.maxsize = maxsize
+            self._evict()
+        if path is not MISSING:
+            self.path = path
+
+    def get(self, key, default=MISSING):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires_at = entry
+        if expires_at <= time.time():
+            del self._data[key]
+            self.expired += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        self._data[key] = (value, time.time() + ttl)
+        self._data.move_to_end(key)
+        self._evict()
+        self._dirty = True
+        if self.path and time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    def clear(self):
+        self._data.clear()
+        self._dirty = True
+
+    def _evict(self):
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "persistent": bool(self.path),
+        }
+
+    def load(self):
+        if not self.path or not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                entries = json.load(f)
+            now = time.time()
+            for key, value, expires_at in entries:
+                if expires_at > now:
+                    self._data[tuple(key)] = (value, expires_at)
+            self._evict()
+            log_event("cache_loaded", path=self.path, entries=len(self._data))
+        except Exception as e:
+            log_event("cache_load_error", path=self.path, error=str(e))
+
+    def save(self):
+        self._last_save = time.monotonic()
+        if not self.path or not self._dirty:
+            return
+        now = time.time()
+        entries = [[list(key), value, expires_at] for key, (value, expires_at) in self._data.items() if expires_at > now]
+        try:
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".cache.", suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except Exception as e:
+            log_event("cache_save_error", path=self.path, error=str(e))
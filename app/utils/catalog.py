@@ -0,0 +1,243 @@
+import os
+import gzip
+import json
+import time
+import bisect
+import asyncio
+import hashlib
+import tempfile
+from collections import OrderedDict
+from app.utils.logging import log_event
+from app.utils.normalization import fold_provider_name
+from app.utils.tmdb import fetch_watch_providers, get_regions
+
+try:
+    import brotli
+except ImportError:  # optional; responses fall back to gzip
+    brotli = None
+
+# Shipped with the image and used until the first refresh from TMDb
+BUNDLED_CATALOG = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static", "providers.json")
+LOGO_BASE_URL = "https://image.tmdb.org/t/p/original"
+# Bodies smaller than this aren't worth compressing
+MIN_COMPRESS_SIZE = 512
+
+def choose_encoding(accept_encoding: str):
+    """Pick "br" or "gzip" from an Accept-Encoding header, or None for identity."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", accepted.get("*", 0)) > 0:
+        return "gzip"
+    return None
+
+class ProviderCatalog:
+    """
+    TMDb's watch-provider list as served to the UI, ordered by display
+    priority. A sorted list of (word suffix, position) keys backs prefix
+    search, so "prime" finds "Amazon Prime Video" with a bisect rather than
+    a scan. Encoded response bodies are memoized until the catalog changes.
+    """
+
+    def __init__(self, path=None, fallback=BUNDLED_CATALOG, max_responses=256, reload_interval=30.0):
+        self.path = path
+        self.fallback = fallback
+        self.max_responses = max_responses
+        self.reload_interval = reload_interval
+        self.providers = []
+        self.version = ""
+        self.updated_at = None
+        self._keys = []
+        self._responses = OrderedDict()
+        self._mtime = None
+        self._checked = 0.0
+
+    def _set(self, providers, updated_at=None):
+        keys = []
+        for position, provider in enumerate(providers):
+            words = fold_provider_name(provider["name"]).split(" ")
+            keys.extend((" ".join(words[i:]), position) for i in range(len(words)))
+        keys.sort()
+        self.providers = providers
+        self.updated_at = updated_at
+        self._keys = keys
+        self.version = hashlib.sha256(json.dumps(providers, sort_keys=True).encode()).hexdigest()[:16]
+        self._responses.clear()
+
+    # --- Persistence ---
+
+    def load(self):
+        for path in (self.path, self.fallback):
+            if not path or not os.path.isfile(path):
+                continue
+            try:
+                mtime = os.stat(path).st_mtime
+                with open(path, "r") as f:
+                    data = json.load(f)
+                # The bundled file is a bare list; the persisted one carries its refresh time
+                if isinstance(data, list):
+                    data = {"providers": data}
+                providers = [p for p in data["providers"] if p.get("name") and p.get("logo")]
+            except Exception as e:
+                log_event("provider_catalog_load_error", path=path, error=str(e))
+                continue
+            self._set(providers, data.get("updated_at"))
+            self._mtime = mtime if path == self.path else None
+            log_event("provider_catalog_loaded", path=path, providers=len(providers))
+            return
+
+    def maybe_reload(self):
+        """Pick up a catalog another worker refreshed; stats the file at most every `reload_interval` seconds."""
+        now = time.monotonic()
+        if not self.path or now - self._checked < self.reload_interval:
+            return
+        self._checked = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.load()
+
+    def save(self):
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".providers.", suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"updated_at": self.updated_at, "providers": self.providers}, f)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.stat(self.path).st_mtime
+
+    def replace(self, providers) -> bool:
+        """Swap in a freshly fetched catalog and persist it. Returns whether the list changed."""
+        previous = self.version
+        self._set(providers, time.time())
+        if self.path:
+            self.save()
+        return self.version != previous
+
+    # --- Search ---
+
+    def search(self, q=""):
+        q = fold_provider_name(q)
+        if not q:
+            return self.providers
+        positions = set()
+        i = bisect.bisect_left(self._keys, (q,))
+        while i < len(self._keys) and self._keys[i][0].startswith(q):
+            positions.add(self._keys[i][1])
+            i += 1
+        return [self.providers[p] for p in sorted(positions)]
+
+    def etag(self, q="", offset=0, limit=100):
+        query = hashlib.sha256(f"{fold_provider_name(q)}|{offset}|{limit}".encode()).hexdigest()[:8]
+        # Weak: the same ETag covers the gzip, brotli and identity encodings
+        return f'W/"{self.version}-{query}"'
+
+    def render(self, q="", offset=0, limit=100, accept_encoding=""):
+        """JSON page of matches as (body, content_encoding), memoized per query and encoding."""
+        encoding = choose_encoding(accept_encoding)
+        key = (fold_provider_name(q), offset, limit, encoding)
+        cached = self._responses.get(key)
+        if cached is not None:
+            self._responses.move_to_end(key)
+            return cached
+
+        matches = self.search(q)
+        body = json.dumps({
+            "version": self.version,
+            "updated_at": self.updated_at,
+            "total": len(matches),
+            "offset": offset,
+            "limit": limit,
+            "items": matches[offset:offset + limit],
+        }, separators=(",", ":")).encode()
+        if len(body) < MIN_COMPRESS_SIZE:
+            encoding = None
+        elif encoding == "br":
+            body = brotli.compress(body, quality=5)
+        elif encoding == "gzip":
+            body = gzip.compress(body, compresslevel=6)
+
+        self._responses[key] = (body, encoding)
+        while len(self._responses) > self.max_responses:
+            self._responses.popitem(last=False)
+        return body, encoding
+
+    def stats(self):
+        return {
+            "providers": len(self.providers),
+            "version": self.version,
+            "updated_at": self.updated_at,
+            "source": "tmdb" if self.updated_at else "bundled",
+            "memoized_responses": len(self._responses),
+        }
+
+provider_catalog = ProviderCatalog()
+_catalog_refresher = None
+
+def init_provider_catalog(path):
+    provider_catalog.path = path
+    provider_catalog.load()
+
+# --- Periodic refresh from TMDb ---
+
+async def refresh_provider_catalog(config):
+    """Merge TMDb's movie and TV provider lists for the configured regions into one catalog."""
+    api_key = config["TMDB_API_KEY"]
+    merged = {}
+    for region in get_regions(config):
+        for media_type in ("movie", "tv"):
+            for item in await fetch_watch_providers(api_key, media_type, region):
+                if not item.get("provider_name") or not item.get("logo_path"):
+                    continue
+                priority = item.get("display_priorities", {}).get(region, item.get("display_priority", 999))
+                entry = merged.get(item["provider_id"])
+                if entry is None:
+                    merged[item["provider_id"]] = {
+                        "id": item["provider_id"],
+                        "name": item["provider_name"],
+                        "logo": LOGO_BASE_URL + item["logo_path"],
+                        "priority": priority,
+                    }
+                else:
+                    entry["priority"] = min(entry["priority"], priority)
+    if not merged:
+        return
+    providers = sorted(merged.values(), key=lambda p: (p["priority"], p["name"].lower()))
+    changed = await asyncio.to_thread(provider_catalog.replace, providers)
+    log_event("provider_catalog_refreshed", providers=len(providers), changed=changed)
+
+async def _catalog_refresh_loop(load_config, interval):
+    while True:
+        config = load_config()
+        wait = interval - (time.time() - (provider_catalog.updated_at or 0))
+        if wait <= 0 and config.get("TMDB_API_KEY"):
+            try:
+                await refresh_provider_catalog(config)
+                wait = interval
+            except Exception as e:
+                log_event("provider_catalog_error", error=str(e))
+                wait = min(interval, 900)
+        await asyncio.sleep(max(wait, 60))
+
+def start_catalog_refresher(load_config):
+    global _catalog_refresher
+    interval = float(load_config().get("PROVIDER_CATALOG_REFRESH_INTERVAL", 24)) * 3600
+    if interval > 0:
+        _catalog_refresher = asyncio.create_task(_catalog_refresh_loop(load_config, interval))
+
+async def stop_catalog_refresher():
+    if _catalog_refresher is not None:
+        _catalog_refresher.cancel()
+        await asyncio.gather(_catalog_refresher, return_exceptions=True)
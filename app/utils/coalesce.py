@@ -0,0 +1,62 @@
+import time
+import asyncio
+from collections import OrderedDict
+
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key into one in-flight coroutine.
+
+    Callers that arrive while a call is running await the same task and
+    receive its result (or exception) instead of starting their own.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key, fn):
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.shared += 1
+        # Shield so one cancelled waiter doesn't cancel the call for the others
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {"in_flight": len(self._inflight), "calls": self.calls, "shared": self.shared}
+
+class DedupWindow:
+    """
+    Remember keys for `window` seconds; `seen` reports whether a key was
+    already recorded inside the window and records it if not.
+    """
+
+    def __init__(self, window=60.0, maxsize=10000):
+        self.window = window
+        self.maxsize = maxsize
+        self._seen = OrderedDict()
+        self.duplicates = 0
+
+    def _purge(self, now):
+        while self._seen:
+            key, first_seen = next(iter(self._seen.items()))
+            if now - first_seen < self.window and len(self._seen) <= self.maxsize:
+                break
+            self._seen.popitem(last=False)
+
+    def seen(self, key) -> bool:
+        now = time.monotonic()
+        self._purge(now)
+        if key in self._seen:
+            self.duplicates += 1
+            return True
+        self._seen[key] = now
+        return False
+
+    def stats(self):
+        return {"window": self.window, "tracked": len(self._seen), "duplicates": self.duplicates}
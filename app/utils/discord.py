@@ -1,4 +1,223 @@
-import logging
+import time
+import random
+import asyncio
+import httpx
+from app.utils.http import request
+from app.utils.logging import log_event
+from app.utils.metrics import STAGE_LATENCY
 
-def send_discord_notification(title, request_id, available_on, reason, action):
-    logging.info(f"Mock Discord notify: {title} ({request_id}) {action}. Found on: {available_on}. Reason: {reason}")
+# Discord allows 10 embeds per webhook message and ~5 requests per 2 s per webhook
+MAX_EMBEDS_PER_MESSAGE = 10
+
+COLOR_DECLINED = 0xE74C3C
+COLOR_REVIEW = 0xF39C12
+COLOR_APPROVED = 0x2ECC71
+COLOR_INFO = 0x3498DB
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def drain(self, seconds):
+        # Server says we're out of budget: empty the bucket for `seconds`
+        self.tokens = -seconds * self.rate
+        self.updated = time.monotonic()
+
+class DiscordDispatcher:
+    """
+    Buffers notifications and posts them in the background, coalescing
+    everything queued within `window` seconds for the same webhook into
+    multi-embed messages. Sends are paced by a token bucket, honor
+    Discord's rate-limit headers and are retried with backoff.
+    """
+
+    def __init__(self, window=2.0, rate=2.5, burst=5, max_retries=5):
+        self.window = window
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self._queue = None
+        self._task = None
+        self.sent = 0
+        self.failed = 0
+        self.rate_limited = 0
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def enqueue(self, webhook_url, embed, request_id, event_prefix):
+        self._ensure_started()
+        self._queue.put_nowait((webhook_url, embed, request_id, event_prefix))
+
+    async def stop(self, timeout=10.0):
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            log_event("discord_flush_timeout", pending=self._queue.qsize())
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._queue = None
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            try:
+                by_webhook = {}
+                for item in batch:
+                    by_webhook.setdefault(item[0], []).append(item)
+                for webhook_url, items in by_webhook.items():
+                    for start in range(0, len(items), MAX_EMBEDS_PER_MESSAGE):
+                        await self._send(webhook_url, items[start:start + MAX_EMBEDS_PER_MESSAGE])
+            except Exception as e:
+                log_event("discord_dispatch_error", error=str(e))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _send(self, webhook_url, items):
+        payload = {"embeds": [embed for _, embed, _, _ in items]}
+        error = None
+        for attempt in range(1, self.max_retries + 1):
+            await self.bucket.acquire()
+            try:
+                with STAGE_LATENCY.time("discord_notify"):
+                    response = await request("POST", webhook_url, json=payload)
+                self._observe_rate_limit(response)
+                if response.status_code == 429:
+                    self.rate_limited += 1
+                    delay = self._retry_after(response)
+                    log_event("discord_rate_limited", retry_after=delay, attempt=attempt)
+                    self.bucket.drain(delay)
+                    error = "429 Too Many Requests"
+                    continue
+                response.raise_for_status()
+                self.sent += 1
+                for _, _, request_id, event_prefix in items:
+                    log_event(f"{event_prefix}_success", request_id=request_id)
+                return
+            except httpx.HTTPStatusError as e:
+                error = str(e)
+                if e.response.status_code < 500:
+                    break
+            except httpx.HTTPError as e:
+                error = str(e)
+            await asyncio.sleep(min(30.0, 2 ** attempt) * random.uniform(0.5, 1.0))
+
+        self.failed += 1
+        for _, _, request_id, event_prefix in items:
+            log_event(f"{event_prefix}_failed", request_id=request_id, error=error)
+
+    def _retry_after(self, response):
+        value = response.headers.get("Retry-After")
+        if value is None:
+            try:
+                value = response.json().get("retry_after")
+            except ValueError:
+                value = None
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            return 1.0
+
+    def _observe_rate_limit(self, response):
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset_after = response.headers.get("X-RateLimit-Reset-After")
+        if remaining == "0" and reset_after:
+            try:
+                self.bucket.drain(float(reset_after))
+            except ValueError:
+                pass
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "sent": self.sent,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+        }
+
+dispatcher = DiscordDispatcher()
+
+def _notify(config, embed, request_id, event_prefix):
+    dispatcher.window = float(config.get("DISCORD_BATCH_WINDOW", 2))
+    dispatcher.enqueue(config['DISCORD_WEBHOOK_URL'], embed, request_id, event_prefix)
+
+def send_discord_notification(config, title, request_id, available_on, reason, action):
+    embed = {
+        "title": f"🚫 Request {action}",
+        "description": (
+            f"**{title}** (Request ID: {request_id}) was **{action}** "
+            f"because it is available on: {', '.join(available_on)}.\nReason: {reason}"
+        ),
+        "color": COLOR_DECLINED,
+    }
+    _notify(config, embed, request_id, "discord_notify")
+
+def send_review_notification(config, title, request_id, reason):
+    overseerr_url = config["OVERSEERR_URL"].rstrip("/")
+    request_link = f"{overseerr_url}/requests/{request_id}"
+    embed = {
+        "title": "⚠️ Manual Review Needed",
+        "url": request_link,
+        "description": (
+            f"**{title}** (Request ID: `{request_id}`) is awaiting manual approval.\n"
+            f"⛔ **Reason:** {reason}\n"
+            f"▶ [Open in Overseerr]({request_link})"
+        ),
+        "color": COLOR_REVIEW,
+    }
+    _notify(config, embed, request_id, "review_notify")
+
+def send_approval_notification(config, title, request_id):
+    overseerr_url = config["OVERSEERR_URL"].rstrip("/")
+    request_link = f"{overseerr_url}/requests/{request_id}"
+    embed = {
+        "title": "✅ Auto-Approved Request",
+        "url": request_link,
+        "description": (
+            f"**{title}** (Request ID: `{request_id}`) has been automatically approved because it is **not available** on any of your selected streaming platforms.\n"
+            f"▶ [View in Overseerr]({request_link})"
+        ),
+        "color": COLOR_APPROVED,
+    }
+    _notify(config, embed, request_id, "approval_notify")
+
+def send_reconcile_summary(config, counts):
+    lines = [f"• **{action}**: {count}" for action, count in sorted(counts.items())]
+    embed = {
+        "title": "🧹 Reconciliation complete",
+        "description": "\n".join(lines) if lines else "No requests needed action.",
+        "color": COLOR_INFO,
+    }
+    _notify(config, embed, None, "reconcile_notify")
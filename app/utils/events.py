@@ -0,0 +1,168 @@
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from app.utils.logging import add_event_listener, sanitize
+from app.utils.metrics import Counter, register_gauges
+
+# log_event types shown in the UI's live feed, besides errors and warnings
+FEED_EVENTS = frozenset({
+    "webhook_queued", "duplicate_webhook", "decision", "decision_deferred",
+    "request_approved", "request_declined", "request_deleted",
+    "job_retry", "job_failed", "jobs_recovered",
+    "reconcile_started", "reconcile_finished",
+    "circuit_opened", "circuit_closed", "upstream_health_changed", "discord_rate_limited",
+    "config_updated", "rules_updated", "provider_catalog_refreshed",
+})
+
+FEED_DROPPED = Counter("availarr_event_feed_dropped_total", "Live feed events dropped for slow clients")
+
+def is_feed_event(event_type, level) -> bool:
+    return level >= logging.WARNING or event_type in FEED_EVENTS or event_type.endswith(("_error", "_failed"))
+
+class Subscriber:
+    """One connected client: a bounded queue plus a count of events it was too slow to take."""
+
+    def __init__(self, maxsize):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.connected_at = time.time()
+
+class EventFeed:
+    """
+    Recent decision and error events for the UI. `publish` is called from
+    log_event on whatever thread logged: it appends to a ring buffer and
+    hands the event to each subscriber's bounded queue without waiting.
+    A subscriber whose queue is full misses the event and is told how many
+    it missed, so a stalled browser tab never holds up the webhook path.
+    """
+
+    def __init__(self, size=500, client_queue=100, max_clients=20):
+        self.buffer = deque(maxlen=size)
+        self.client_queue = client_queue
+        self.max_clients = max_clients
+        self.subscribers = set()
+        self.published = 0
+        self.dropped = 0
+        self._next_id = 0
+        self._id_lock = threading.Lock()
+        self._loop = None
+        self._loop_thread = None
+
+    def publish(self, event_type, level, data):
+        if not is_feed_event(event_type, level):
+            return
+        with self._id_lock:
+            self._next_id += 1
+            event_id = self._next_id
+        event = (event_id, time.time(), event_type, logging.getLevelName(level), data)
+        self.buffer.append(event)
+        self.published += 1
+        if not self.subscribers:
+            return
+        if threading.get_ident() == self._loop_thread:
+            self._deliver(event)
+        elif self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._deliver, event)
+
+    def _deliver(self, event):
+        for subscriber in tuple(self.subscribers):
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscriber.dropped += 1
+                self.dropped += 1
+                FEED_DROPPED.inc()
+
+    @property
+    def full(self):
+        return len(self.subscribers) >= self.max_clients
+
+    def subscribe(self):
+        """Register a client on the running loop, or return None if the client limit is reached."""
+        if self.full:
+            return None
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        subscriber = Subscriber(self.client_queue)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    def backlog(self, after_id=None, limit=50):
+        events = [event for event in tuple(self.buffer) if after_id is None or event[0] > after_id]
+        return events[-limit:] if limit else []
+
+    def stats(self):
+        return {
+            "buffered": len(self.buffer),
+            "published": self.published,
+            "clients": len(self.subscribers),
+            "dropped": self.dropped,
+        }
+
+def format_sse(event):
+    """One event in text/event-stream framing; data is the JSON event on a single line."""
+    event_id, timestamp, event_type, level, data = event
+    payload = json.dumps(
+        {"id": event_id, "time": timestamp, "event": event_type, "level": level, "data": sanitize(data)},
+        default=str, separators=(",", ":"),
+    )
+    return f"id: {event_id}\ndata: {payload}\n\n"
+
+async def stream(feed, after_id=None, backlog=50, heartbeat=15.0):
+    """
+    text/event-stream body for one client: buffered events (those after
+    `after_id` when resuming, else the last `backlog`), then live ones.
+    A comment line is sent when idle so proxies keep the connection open
+    and a dead client is noticed. The client is subscribed only once the
+    body is being sent, so a request that never gets that far leaves
+    nothing behind.
+    """
+    subscriber = feed.subscribe()
+    if subscriber is None:
+        return
+    try:
+        yield "retry: 3000\n\n"
+        last_id = 0
+        for event in feed.backlog(after_id, feed.buffer.maxlen if after_id is not None else backlog):
+            yield format_sse(event)
+            last_id = event[0]
+        reported = 0
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if subscriber.dropped > reported:
+                yield f"event: dropped\ndata: {json.dumps({'count': subscriber.dropped - reported})}\n\n"
+                reported = subscriber.dropped
+            # Events published while the backlog was being sent are also queued
+            if event[0] > last_id:
+                yield format_sse(event)
+                last_id = event[0]
+    finally:
+        feed.unsubscribe(subscriber)
+
+def configure_event_feed(config):
+    size = int(config.get("EVENT_FEED_SIZE", 500))
+    if size != event_feed.buffer.maxlen:
+        event_feed.buffer = deque(event_feed.buffer, maxlen=size)
+    event_feed.client_queue = int(config.get("EVENT_FEED_CLIENT_QUEUE", 100))
+    event_feed.max_clients = int(config.get("EVENT_FEED_MAX_CLIENTS", 20))
+
+event_feed = EventFeed()
+add_event_listener(event_feed.publish)
+
+def _feed_gauges():
+    stats = event_feed.stats()
+    return [
+        ("availarr_event_feed_clients", "Connected live feed clients", (), {(): stats["clients"]}),
+    ]
+
+register_gauges(_feed_gauges)
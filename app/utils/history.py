@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+from app.utils.logging import log_event
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS decisions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    source TEXT NOT NULL,
+    request_id TEXT,
+    tmdb_id TEXT,
+    media_type TEXT,
+    title TEXT,
+    status INTEGER,
+    action TEXT NOT NULL,
+    matched TEXT NOT NULL DEFAULT '[]',
+    unmatched TEXT NOT NULL DEFAULT '[]',
+    latency_ms TEXT NOT NULL DEFAULT '{}',
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS decisions_created_at ON decisions (created_at);
+CREATE INDEX IF NOT EXISTS decisions_tmdb_id ON decisions (tmdb_id, id);
+CREATE INDEX IF NOT EXISTS decisions_action ON decisions (action, id);
+"""
+
+COLUMNS = ("created_at", "source", "request_id", "tmdb_id", "media_type", "title", "status",
+           "action", "matched", "unmatched", "latency_ms", "error")
+JSON_COLUMNS = ("matched", "unmatched", "latency_ms")
+
+class DecisionHistory:
+    """
+    Append-only SQLite log of every decision Availarr makes.
+
+    `record` only buffers the entry on the event loop; a background task
+    writes buffered entries in one transaction every `flush_interval`
+    seconds (or sooner once `batch_size` are waiting) and deletes rows
+    older than the retention period about once an hour.
+    """
+
+    def __init__(self, path, flush_interval=1.0, batch_size=200, retention_days=90):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.retention_days = retention_days
+        self._conn = None
+        self._lock = threading.Lock()
+        self._pending = []
+        self._wakeup = None
+        self._task = None
+        self._last_compact = 0.0
+        self.written = 0
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.row_factory = sqlite3.Row
+            # auto_vacuum only takes effect if set before anything (even the
+            # WAL switch) writes to a new file; an existing file needs a VACUUM
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                conn.execute("VACUUM")
+                log_event("history_vacuumed", path=self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # --- Writing ---
+
+    def record(self, source, action, request_id=None, tmdb_id=None, media_type=None, title=None,
+               status=None, matched=(), unmatched=(), latency_ms=None, error=None):
+        self._pending.append((
+            time.time(), source,
+            None if request_id is None else str(request_id),
+            None if tmdb_id is None else str(tmdb_id),
+            media_type, title, status, action,
+            json.dumps(sorted(matched)), json.dumps(sorted(unmatched)),
+            json.dumps(latency_ms or {}), error,
+        ))
+        if len(self._pending) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def write(self, rows):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                conn.executemany(
+                    f"INSERT INTO decisions ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", rows
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        self.written += len(rows)
+
+    async def flush(self):
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        try:
+            await asyncio.to_thread(self.write, rows)
+        except sqlite3.Error as e:
+            log_event("history_write_failed", rows=len(rows), error=str(e))
+
+    def compact(self) -> int:
+        cutoff = time.time() - self.retention_days * 86400
+        with self._lock:
+            conn = self._connect()
+            deleted = conn.execute("DELETE FROM decisions WHERE created_at < ?", (cutoff,)).rowcount
+            if deleted:
+                conn.execute("PRAGMA incremental_vacuum")
+        return deleted
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+            if self.retention_days > 0 and time.monotonic() - self._last_compact >= 3600:
+                self._last_compact = time.monotonic()
+                try:
+                    deleted = await asyncio.to_thread(self.compact)
+                    if deleted:
+                        log_event("history_compacted", deleted=deleted, retention_days=self.retention_days)
+                except sqlite3.Error as e:
+                    log_event("history_compact_failed", error=str(e))
+
+    def start(self, config):
+        self.retention_days = float(config.get("HISTORY_RETENTION_DAYS", 90))
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        self.close()
+
+    # --- Reading ---
+
+    def query(self, action=None, source=None, tmdb_id=None, request_id=None, since=None, until=None,
+              limit=50, cursor=None):
+        """
+        Newest-first page of decisions. Pass the returned `next_cursor` back
+        as `cursor` for the next page; it is None on the last page.
+        """
+        clauses, params = [], []
+        for column, value in (("action", action), ("source", source), ("tmdb_id", tmdb_id), ("request_id", request_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(str(value))
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(cursor)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT * FROM decisions {where} ORDER BY id DESC LIMIT ?", (*params, limit + 1)
+            ).fetchall()
+
+        items = []
+        for row in rows[:limit]:
+            item = dict(row)
+            for column in JSON_COLUMNS:
+                item[column] = json.loads(item[column])
+            items.append(item)
+        next_cursor = items[-1]["id"] if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    def stats(self):
+        with self._lock:
+            conn = self._connect()
+            total, oldest = conn.execute("SELECT COUNT(*), MIN(created_at) FROM decisions").fetchone()
+            by_action = dict(conn.execute("SELECT action, COUNT(*) FROM decisions GROUP BY action").fetchall())
+        return {
+            "total": total,
+            "oldest": oldest,
+            "by_action": by_action,
+            "buffered": len(self._pending),
+            "written": self.written,
+            "retention_days": self.retention_days,
+        }
@@ -1,3 +1,235 @@
+import time
+import random
+import asyncio
+import httpx
+from app.utils.logging import log_event
+from app.utils.metrics import Counter, register_gauges, UPSTREAM_RESPONSES, UPSTREAM_LATENCY
+
+# One keep-alive connection pool per upstream host, so a slow or saturated
+# host can't starve requests to the others.
+DEFAULT_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+DEFAULT_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0)
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+UPSTREAM_RETRIES = Counter("availarr_upstream_retries_total", "Upstream requests retried", ["host"])
+UPSTREAM_HEDGES = Counter("availarr_upstream_hedges_total", "Hedged duplicate requests sent", ["host"])
+UPSTREAM_REJECTED = Counter("availarr_upstream_circuit_rejections_total", "Requests failed fast by an open circuit", ["host"])
+
+# Tunables, overridable from config via configure_http()
+settings = {
+    "retries": 2,
+    "backoff": 0.5,
+    "hedge_delay": 2.0,
+    "failure_threshold": 5,
+    "reset_timeout": 30.0,
+}
+
+_clients = {}
+_breakers = {}
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised without contacting the host while its circuit breaker is open."""
+
+class MetricsTransport(httpx.AsyncHTTPTransport):
+    """Connection-pooling transport that records status counts and latency per host."""
+
+    async def handle_async_request(self, request):
+        host = request.url.host
+        start = time.perf_counter()
+        try:
+            response = await super().handle_async_request(request)
+        except Exception:
+            UPSTREAM_RESPONSES.inc(host, "error")
+            raise
+        finally:
+            UPSTREAM_LATENCY.observe(time.perf_counter() - start, host)
+        UPSTREAM_RESPONSES.inc(host, response.status_code)
+        return response
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds, then lets a single trial call through.
+    """
+
+    def __init__(self, host):
+        self.host = host
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= settings["reset_timeout"]:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        # One trial at a time; a trial that never reported back is given up on
+        now = time.monotonic()
+        if state == "half_open" and (self.trial_started is None or now - self.trial_started >= settings["reset_timeout"]):
+            self.trial_started = now
+            return True
+        return False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            log_event("circuit_closed", host=self.host)
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_started = None
+        if self.failures >= settings["failure_threshold"]:
+            if self.opened_at is None:
+                log_event("circuit_opened", host=self.host, failures=self.failures)
+            self.opened_at = time.monotonic()
+
+def _breaker_gauges():
+    states = {"closed": 0, "half_open": 1, "open": 2}
+    return [(
+        "availarr_upstream_circuit_state", "Circuit breaker state per host (0 closed, 1 half-open, 2 open)",
+        ("host",), {(host,): states[b.state] for host, b in _breakers.items()},
+    )]
+
+register_gauges(_breaker_gauges)
+
+def configure_http(config):
+    settings["retries"] = int(config.get("HTTP_RETRIES", settings["retries"]))
+    settings["hedge_delay"] = float(config.get("HTTP_HEDGE_DELAY", settings["hedge_delay"]))
+    settings["failure_threshold"] = int(config.get("CIRCUIT_FAILURE_THRESHOLD", settings["failure_threshold"]))
+    settings["reset_timeout"] = float(config.get("CIRCUIT_RESET_TIMEOUT", settings["reset_timeout"]))
+
+def _new_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(timeout=DEFAULT_TIMEOUT, transport=MetricsTransport(limits=DEFAULT_LIMITS))
+
+def get_client(host="default") -> httpx.AsyncClient:
+    client = _clients.get(host)
+    if client is None or client.is_closed:
+        client = _clients[host] = _new_client()
+    return client
+
+async def warm_clients(urls, timeout=3.0):
+    """
+    Build the pools for upstream base URLs before the first webhook needs
+    them. Creating a client loads the CA bundle, so that happens off the
+    event loop; a HEAD to the host root then opens a keep-alive connection.
+    """
+    warmed = []
+    for url in urls:
+        try:
+            url = httpx.URL(url or "")
+        except httpx.InvalidURL:
+            continue
+        host = url.netloc.decode("ascii")
+        if not url.scheme or not host or host in _clients:
+            continue
+        client = await asyncio.to_thread(_new_client)
+        if _clients.setdefault(host, client) is not client:
+            # A request created this host's pool while we were building ours
+            await client.aclose()
+            continue
+        try:
+            await client.head(f"{url.scheme}://{host}/", timeout=timeout)
+        except httpx.HTTPError:
+            pass
+        warmed.append(host)
+    return warmed
+
+def get_breaker(host) -> CircuitBreaker:
+    breaker = _breakers.get(host)
+    if breaker is None:
+        breaker = _breakers[host] = CircuitBreaker(host)
+    return breaker
+
+def circuit_states():
+    return {host: breaker.state for host, breaker in _breakers.items()}
+
+async def close_client():
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        if not client.is_closed:
+            await client.aclose()
+
+async def _hedged_send(client, host, method, url, delay, **kwargs):
+    # Send once; if no answer within `delay`, send a duplicate and take whichever succeeds first
+    first = asyncio.ensure_future(client.request(method, url, **kwargs))
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result()
+
+    UPSTREAM_HEDGES.inc(host)
+    pending = {first, asyncio.ensure_future(client.request(method, url, **kwargs))}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def request(method, url, *, idempotent=None, hedge=None, retries=None, **kwargs) -> httpx.Response:
+    """
+    Send a request through the host's pool and circuit breaker.
+
+    Idempotent requests are retried with exponential backoff on transport
+    errors and 429/5xx responses, and GETs are hedged after
+    `settings["hedge_delay"]`. Returns the final response without raising
+    for status; raises CircuitOpenError when the host is failing fast.
+    """
+    method = method.upper()
+    # Pools and breakers are per host:port, so two services on one machine stay independent
+    host = httpx.URL(url).netloc.decode("ascii")
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+    if hedge is None:
+        hedge = method == "GET"
+    if retries is None:
+        retries = settings["retries"] if idempotent else 0
+
+    client = get_client(host)
+    breaker = get_breaker(host)
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            UPSTREAM_REJECTED.inc(host)
+            raise CircuitOpenError(f"Circuit open for {host}")
+        try:
+            if hedge and settings["hedge_delay"] > 0:
+                response = await _hedged_send(client, host, method, url, settings["hedge_delay"], **kwargs)
+            else:
+                response = await client.request(method, url, **kwargs)
+        except httpx.TransportError:
+            breaker.record_failure()
+            if attempt >= retries:
+                raise
+        else:
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            if response.status_code not in RETRYABLE_STATUS or attempt >= retries:
+                return response
+
+        attempt += 1
+        UPSTREAM_RETRIES.inc(host)
+        await asyncio.sleep(settings["backoff"] * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
 def get_tmdb_headers(api_key):
     return {
         "Authorization": f"Bearer {api_key}"
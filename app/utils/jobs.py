@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import asyncio
+import threading
+from app.utils.logging import log_event
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_run_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_next_run ON jobs (status, next_run_at);
+"""
+
+class JobQueue:
+    """
+    Persistent FIFO job queue backed by SQLite.
+
+    Jobs move pending -> running -> (deleted | pending for retry | failed).
+    Jobs left running by a crash are put back to pending by `recover`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def enqueue(self, kind, payload) -> int:
+        now = time.time()
+        with self._lock:
+            cur = self._connect().execute(
+                "INSERT INTO jobs (kind, payload, next_run_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, json.dumps(payload), now, now, now),
+            )
+            return cur.lastrowid
+
+    def claim(self):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'pending' AND next_run_at <= ? ORDER BY next_run_at, id LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                        (now, row["id"]),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["attempts"] += 1
+        return job
+
+    def complete(self, job_id):
+        with self._lock:
+            self._connect().execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def retry(self, job_id, error, delay):
+        now = time.time()
+        with self._lock:
+            self._connect().execute(
+                "UPDATE jobs SET status = 'pending', next_run_at = ?, updated_at = ?, last_error = ? WHERE id = ?",
+                (now + delay, now, error, job_id),
+            )
+
+    def fail(self, job_id, error):
+        with self._lock:
+            self._connect().execute(
+                "UPDATE jobs SET status = 'failed', updated_at = ?, last_error = ? WHERE id = ?",
+                (time.time(), error, job_id),
+            )
+
+    def recover(self, stale_after=None) -> int:
+        """Put running jobs back to pending; only those idle for `stale_after` seconds if given."""
+        now = time.time()
+        cutoff = now if stale_after is None else now - stale_after
+        with self._lock:
+            cur = self._connect().execute(
+                "UPDATE jobs SET status = 'pending', updated_at = ? WHERE status = 'running' AND updated_at <= ?",
+                (now, cutoff),
+            )
+            return cur.rowcount
+
+    def requeue_failed(self) -> int:
+        now = time.time()
+        with self._lock:
+            cur = self._connect().execute(
+                "UPDATE jobs SET status = 'pending', attempts = 0, next_run_at = ?, updated_at = ? WHERE status = 'failed'",
+                (now, now),
+            )
+            return cur.rowcount
+
+    def stats(self, failed_limit=50):
+        with self._lock:
+            conn = self._connect()
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            failed = [
+                dict(row) for row in conn.execute(
+                    "SELECT id, kind, attempts, created_at, updated_at, last_error FROM jobs "
+                    "WHERE status = 'failed' ORDER BY updated_at DESC LIMIT ?",
+                    (failed_limit,),
+                )
+            ]
+        return {
+            "depth": counts.get("pending", 0),
+            "in_flight": counts.get("running", 0),
+            "failed": counts.get("failed", 0),
+            "failed_jobs": failed,
+        }
+
+class WorkerPool:
+    """
+    Async workers draining a JobQueue. Handlers are looked up by job kind;
+    a handler that raises is retried with exponential backoff until
+    `max_attempts` is reached, after which the job is marked failed.
+    Handlers are called as `handler(payload, final)`, where `final` is
+    True on the last attempt the job will get.
+    """
+
+    def __init__(self, queue, handlers, concurrency=4, max_attempts=5, backoff=5.0, max_backoff=300.0, poll_interval=1.0,
+                 recover_after=None):
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        # Set when several processes share the queue: a worker may only take
+        # over jobs that have been running longer than this, and checks periodically
+        self.recover_after = recover_after
+        self._tasks = []
+        self._wakeup = None
+
+    @property
+    def running(self):
+        return any(not task.done() for task in self._tasks)
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        await self._recover()
+        self._tasks = [asyncio.create_task(self._run(i)) for i in range(self.concurrency)]
+        if self.recover_after:
+            self._tasks.append(asyncio.create_task(self._recover_loop()))
+        log_event("workers_started", count=self.concurrency)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _recover(self):
+        recovered = await asyncio.to_thread(self.queue.recover, self.recover_after)
+        if recovered:
+            log_event("jobs_recovered", count=recovered)
+            self.notify()
+
+    async def _recover_loop(self):
+        while True:
+            await asyncio.sleep(self.recover_after)
+            try:
+                await self._recover()
+            except Exception as e:
+                log_event("worker_error", worker="recover", error=f"{type(e).__name__}: {e}")
+
+    async def _run(self, worker_id):
+        while True:
+            try:
+                job = await asyncio.to_thread(self.queue.claim)
+                if job is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._execute(worker_id, job)
+            except Exception as e:
+                # e.g. the queue database is locked or the disk is full. Keep the
+                # worker alive; a job whose outcome couldn't be written stays
+                # running until recover() hands it out again
+                log_event("worker_error", worker=worker_id, error=f"{type(e).__name__}: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _execute(self, worker_id, job):
+        handler = self.handlers.get(job["kind"])
+        try:
+            if handler is None:
+                raise LookupError(f"No handler for job kind '{job['kind']}'")
+            await handler(job["payload"], job["attempts"] >= self.max_attempts)
+        except asyncio.CancelledError:
+            # Shutting down mid-job: leave it for recover() on next start
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if job["attempts"] >= self.max_attempts:
+                await asyncio.to_thread(self.queue.fail, job["id"], error)
+                log_event("job_failed", job_id=job["id"], kind=job["kind"], attempts=job["attempts"], error=error)
+            else:
+                delay = min(self.max_backoff, self.backoff * 2 ** (job["attempts"] - 1))
+                delay *= random.uniform(0.8, 1.2)
+                await asyncio.to_thread(self.queue.retry, job["id"], error, delay)
+                log_event("job_retry", job_id=job["id"], kind=job["kind"], attempts=job["attempts"], delay=round(delay, 1), error=error)
+            return
+        await asyncio.to_thread(self.queue.complete, job["id"])
+        log_event("job_completed", job_id=job["id"], kind=job["kind"], worker=worker_id)
@@ -1,10 +1,27 @@
+import os
 import json
+import time
+import queue
+import atexit
+import random
 import logging
-from datetime import datetime, date
+import logging.config
+import logging.handlers
+from datetime import datetime, date, timezone
 from uuid import UUID
 
 logger = logging.getLogger("availarr")
 
+LOGGING_CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logging.json")
+
+# Per-event sampling rates (0.0-1.0) and per-minute caps, loaded from logging.json
+_sample_rates = {}
+_rate_limits = {}
+_rate_windows = {}
+_listener = None
+# Called with (event_type, level, data) for every log_event, whatever the log level; see app/utils/events.py
+_event_listeners = []
+
 def sanitize(obj):
     if isinstance(obj, (datetime, date)):
         return obj.isoformat()
@@ -18,9 +35,105 @@ def sanitize(obj):
         return [sanitize(v) for v in obj]
     return obj
 
-def log_event(event_type, **data):
+class JsonFormatter(logging.Formatter):
+    """
+    Render records as one JSON object per line. Records from log_event carry
+    their payload in `event_data` and are only serialized here, on the
+    listener thread, never on the event loop.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        event_data = getattr(record, "event_data", None)
+        if event_data is not None:
+            entry["event"] = record.msg
+            entry.update(sanitize(event_data))
+        else:
+            entry["message"] = record.getMessage()
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        try:
+            return json.dumps(entry, default=str)
+        except Exception as e:
+            return json.dumps({"time": entry["time"], "level": "ERROR", "event": "logging_failed", "error": str(e)})
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    # The stock QueueHandler formats in the caller's thread; leave that to the listener
+    def prepare(self, record):
+        return record
+
+def setup_logging(config_file=LOGGING_CONFIG_FILE):
+    """
+    Apply logging.json and move every root handler behind a queue so log
+    calls only enqueue the record; a listener thread formats and writes.
+    """
+    global _listener
+    with open(config_file, "r") as f:
+        config = json.load(f)
+
+    options = config.pop("availarr", {})
+    _sample_rates.update(options.get("sampling", {}))
+    _rate_limits.update(options.get("rate_limits", {}))
+
+    level = os.getenv("LOG_LEVEL")
+    if level:
+        config.setdefault("root", {})["level"] = level.upper()
+
+    logging.config.dictConfig(config)
+
+    if _listener is not None:
+        _listener.stop()
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    log_queue = queue.SimpleQueue()
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(DeferredQueueHandler(log_queue))
+    for name in ("uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        for handler in list(uvicorn_logger.handlers):
+            if handler in handlers:
+                uvicorn_logger.removeHandler(handler)
+                uvicorn_logger.addHandler(root.handlers[0])
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+def _should_log(event_type) -> bool:
+    rate = _sample_rates.get(event_type)
+    if rate is not None and random.random() >= rate:
+        return False
+    limit = _rate_limits.get(event_type)
+    if limit is not None:
+        now = time.monotonic()
+        window_start, count = _rate_windows.get(event_type, (now, 0))
+        if now - window_start >= 60:
+            window_start, count = now, 0
+        if count >= limit:
+            _rate_windows[event_type] = (window_start, count + 1)
+            return False
+        _rate_windows[event_type] = (window_start, count + 1)
+    return True
+
+def add_event_listener(listener):
+    _event_listeners.append(listener)
+
+def log_event(event_type, level=logging.INFO, **data):
+    # Listeners see every event, before level and sampling filters. They get
+    # their own copy of the data, and a failing listener never reaches the caller
+    for listener in _event_listeners:
+        try:
+            listener(event_type, level, dict(data))
+        except Exception as e:
+            logger.error(f"[event listener failed] {event_type}: {e}")
+    if not logger.isEnabledFor(level) or not _should_log(event_type):
+        return
     try:
-        sanitized = sanitize({"event": event_type, **data})
-        logger.info(json.dumps(sanitized))
+        logger.log(level, event_type, extra={"event_data": data})
     except Exception as e:
-        logger.error(f"[logging failed] {event_type}: {e} | raw: {data}")
+        logger.error(f"[logging failed] {event_type}: {e}")
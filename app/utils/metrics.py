@@ -0,0 +1,98 @@
+import time
+import bisect
+from contextlib import contextmanager
+
+# Minimal in-process Prometheus instruments. Updates are plain dict/list
+# operations on the event loop thread, so the hot path stays cheap.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+_collectors = []
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+class Timer:
+    """Yielded by Histogram.time; `elapsed` holds the measured seconds once the block exits."""
+    elapsed = None
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        timer = Timer()
+        start = time.perf_counter()
+        try:
+            yield timer
+        finally:
+            timer.elapsed = time.perf_counter() - start
+            self.observe(timer.elapsed, *labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames + ('le',), labels + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+def register_gauges(collector):
+    """Register a callable returning [(name, documentation, labelnames, {labels: value})] at scrape time."""
+    _collectors.append(collector)
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        for name, documentation, labelnames, values in collector():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in values.items():
+                lines.append(f"{name}{_format_labels(labelnames, labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+WEBHOOKS = Counter("availarr_webhooks_total", "Webhooks by outcome", ["outcome"])
+STAGE_LATENCY = Histogram("availarr_stage_duration_seconds", "Latency of each webhook processing stage", ["stage"])
+UPSTREAM_RESPONSES = Counter("availarr_upstream_responses_total", "Upstream HTTP responses by host and status", ["host", "status"])
+UPSTREAM_LATENCY = Histogram("availarr_upstream_request_duration_seconds", "Upstream HTTP request latency by host", ["host"])
+CACHE_LOOKUPS = Counter("availarr_cache_lookups_total", "Cache lookups by result", ["cache", "result"])
@@ -1,3 +1,45 @@
+import re
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Storefront "channel" resellers: "Starz Apple TV Channel" is the Starz service
+_CHANNEL_SUFFIX = re.compile(r"\s+(apple tv|amazon|roku premium)\s+channel$")
+
+# Ad tiers and plan names that don't change which service a title is on
+_TIER_SUFFIXES = (
+    " standard with ads",
+    " basic with ads",
+    " free with ads",
+    " with ads",
+)
+
+# Different TMDb names for the same service, keyed by normalized form
+PROVIDER_ALIASES = {
+    "amazon video": "amazon prime video",
+    "prime video": "amazon prime video",
+    "paramount plus with showtime": "paramount plus",
+    "paramount plus essential": "paramount plus",
+    "paramount plus premium": "paramount plus",
+    "paramount plus originals": "paramount plus",
+    "paramountplus": "paramount plus",
+    "appletv plus": "apple tv plus",
+    "disneyplus": "disney plus",
+    "hbo max": "max",
+    "max originals": "max",
+}
+
+def fold_provider_name(name: str) -> str:
+    """
+    Lower-case a provider name and spell out its symbols, keeping every
+    word. Also the search form used by the provider catalog.
+
+    Example:
+        >>> fold_provider_name("Paramount+  Amazon Channel")
+        'paramount plus amazon channel'
+    """
+    normalized = name.lower().replace("+", " plus ").replace("&", " and ")
+    return _WHITESPACE.sub(" ", normalized).strip()
+
 def normalize_provider(name: str) -> str:
     """
     Normalize a provider name for comparison.
@@ -7,13 +49,51 @@ def normalize_provider(name: str) -> str:
         >>> normalize_provider("Netflix Standard with Ads")
         'netflix'
         >>> normalize_provider("Paramount+ & Showtime")
-        'paramountplus and showtime'
-    """
-    return (
-        name.lower()
-        .strip()
-        .replace("standard with ads", "")
-        .replace("with ads", "")
-        .replace("+", "plus")
-        .replace("&", "and")
-    )
+        'paramount plus and showtime'
+    """
+    normalized = fold_provider_name(name)
+    for suffix in _TIER_SUFFIXES:
+        if normalized.endswith(suffix):
+            normalized = normalized[: -len(suffix)]
+            break
+    return normalized
+
+def canonical_provider(name: str) -> str:
+    """
+    Map a provider name to the service it represents: normalized, with
+    storefront channel suffixes removed and known aliases resolved.
+
+    Example:
+        >>> canonical_provider("Paramount Plus Apple TV Channel ")
+        'paramount plus'
+        >>> canonical_provider("Amazon Video")
+        'amazon prime video'
+    """
+    normalized = _CHANNEL_SUFFIX.sub("", normalize_provider(name))
+    return PROVIDER_ALIASES.get(normalized, normalized)
+
+class ProviderMatcher:
+    """
+    Set-based matcher for a list of allowed providers. Build once per
+    config version and reuse; lookups are O(1) and memoized per name.
+    """
+
+    def __init__(self, allowed_providers):
+        self.allowed = frozenset(canonical_provider(p) for p in allowed_providers if p)
+        self._memo = {}
+
+    def matches(self, provider: str) -> bool:
+        hit = self._memo.get(provider)
+        if hit is None:
+            hit = self._memo[provider] = canonical_provider(provider) in self.allowed
+        return hit
+
+    def match(self, providers):
+        matched = set()
+        unmatched = []
+        for provider in providers:
+            if self.matches(provider):
+                matched.add(provider)
+            else:
+                unmatched.append(provider)
+        return matched, unmatched
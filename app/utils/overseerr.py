@@ -1,7 +1,54 @@
-import logging
+import httpx
+from app.utils.http import request, get_overseerr_headers
+from app.utils.logging import log_event
 
-def delete_approved_request(request_id):
-    logging.info(f"Mock delete request {request_id} (approved)")
+async def delete_approved_request(config, request_id):
+    url = f"{config['OVERSEERR_URL']}/api/v1/request/{request_id}"
+    try:
+        response = await request("DELETE", url, headers=get_overseerr_headers(config['OVERSEERR_API_KEY']))
+        response.raise_for_status()
+        log_event("request_deleted", request_id=request_id)
+        return True
+    except httpx.HTTPError as e:
+        log_event("request_delete_failed", request_id=request_id, error=str(e))
+        return False
 
-def decline_pending_request(request_id):
-    logging.info(f"Mock decline request {request_id} (pending)")
+async def decline_pending_request(config, request_id):
+    url = f"{config['OVERSEERR_URL']}/api/v1/request/{request_id}/decline"
+    try:
+        response = await request("POST", url, headers=get_overseerr_headers(config['OVERSEERR_API_KEY']))
+        response.raise_for_status()
+        log_event("request_declined", request_id=request_id)
+        return True
+    except httpx.HTTPError as e:
+        log_event("request_decline_failed", request_id=request_id, error=str(e))
+        return False
+
+async def approve_request(config, request_id):
+    url = f"{config['OVERSEERR_URL']}/api/v1/request/{request_id}/approve"
+    try:
+        response = await request("POST", url, headers=get_overseerr_headers(config['OVERSEERR_API_KEY']))
+        response.raise_for_status()
+        log_event("request_approved", request_id=request_id)
+        return True
+    except httpx.HTTPError as e:
+        log_event("request_approval_failed", request_id=request_id, error=str(e))
+        return False
+
+async def list_requests(config, request_filter="pending", page_size=100):
+    """Fetch every Overseerr request matching `request_filter`, following pagination."""
+    url = f"{config['OVERSEERR_URL']}/api/v1/request"
+    headers = get_overseerr_headers(config['OVERSEERR_API_KEY'])
+    requests = []
+    while True:
+        params = {"take": page_size, "skip": len(requests), "filter": request_filter, "sort": "added"}
+        response = await request("GET", url, headers=headers, params=params)
+        response.raise_for_status()
+        data = response.json()
+        results = data.get("results", [])
+        requests.extend(results)
+        total = data.get("pageInfo", {}).get("results", 0)
+        if not results or len(requests) >= total:
+            break
+    log_event("requests_listed", filter=request_filter, count=len(requests))
+    return requests
@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS availability (
+    media_type TEXT NOT NULL,
+    tmdb_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    stale INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (media_type, tmdb_id)
+);
+CREATE INDEX IF NOT EXISTS availability_refresh ON availability (stale, fetched_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+class ProviderIndex:
+    """
+    Local SQLite mirror of TMDb watch-provider availability for titles
+    Availarr has looked up. Entries are marked stale from TMDb's changes
+    feeds and refreshed in the background.
+    """
+
+    def __init__(self, path=None, max_age=7 * 24 * 3600):
+        self.path = path
+        self.max_age = max_age
+        self._conn = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def get(self, media_type, tmdb_id):
+        """Return the indexed availability, or None if unknown, stale or too old."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT data, fetched_at, stale FROM availability WHERE media_type = ? AND tmdb_id = ?",
+                (media_type, str(tmdb_id)),
+            ).fetchone()
+        if row is None or row[2] or time.time() - row[1] > self.max_age:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, media_type, tmdb_id, availability):
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO availability (media_type, tmdb_id, data, fetched_at, stale) "
+                "VALUES (?, ?, ?, ?, 0)",
+                (media_type, str(tmdb_id), json.dumps(availability, separators=(",", ":")), time.time()),
+            )
+
+    def mark_stale(self, media_type, tmdb_ids) -> int:
+        with self._lock:
+            conn = self._connect()
+            before = conn.total_changes
+            conn.executemany(
+                "UPDATE availability SET stale = 1 WHERE media_type = ? AND tmdb_id = ?",
+                [(media_type, str(i)) for i in tmdb_ids],
+            )
+            return conn.total_changes - before
+
+    def due_for_refresh(self, limit=500):
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            return self._connect().execute(
+                "SELECT media_type, tmdb_id FROM availability WHERE stale = 1 OR fetched_at < ? "
+                "ORDER BY stale DESC, fetched_at LIMIT ?",
+                (cutoff, limit),
+            ).fetchall()
+
+    def get_meta(self, key, default=None):
+        with self._lock:
+            row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self._lock:
+            self._connect().execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def stats(self):
+        if not self.enabled:
+            return {"enabled": False}
+        with self._lock:
+            conn = self._connect()
+            total, stale = conn.execute("SELECT COUNT(*), COALESCE(SUM(stale), 0) FROM availability").fetchone()
+        return {
+            "enabled": True,
+            "titles": total,
+            "stale": stale,
+            "hits": self.hits,
+            "misses": self.misses,
+            "last_sync": self.get_meta("last_sync"),
+        }
@@ -0,0 +1,219 @@
+import time
+from datetime import date, timedelta
+from app.utils.normalization import ProviderMatcher
+from app.utils.tmdb import select_providers
+
+# Rule actions -> decision for a pending (2) or already approved (1) request
+ACTIONS = {
+    "approve": lambda status: "approved",
+    "decline": lambda status: "deleted" if status == 1 else "declined",
+    "review": lambda status: "review",
+}
+STATUS_NAMES = {"pending": 2, "approved": 1}
+
+class RuleError(ValueError):
+    """A rule in config is malformed; the message names the rule and the field."""
+
+class Facts:
+    """What the rules can see about one request. Provider lists are flattened per region set on first use."""
+
+    __slots__ = ("media_type", "status", "requested_by", "availability", "monetization_types", "details", "_providers")
+
+    def __init__(self, media_type, status, requested_by=(), availability=None, monetization_types=("flatrate",),
+                 details=None):
+        self.media_type = media_type
+        self.status = status
+        self.requested_by = frozenset(str(user).lower() for user in requested_by if user)
+        self.availability = availability or {}
+        self.monetization_types = monetization_types
+        self.details = details or {}
+        self._providers = {}
+
+    def providers(self, regions):
+        providers = self._providers.get(regions)
+        if providers is None:
+            providers = self._providers[regions] = select_providers(self.availability, regions, self.monetization_types)
+        return providers
+
+class Rule:
+    """One compiled rule: predicates ordered cheapest first, all of which must hold."""
+
+    __slots__ = ("name", "action", "reason", "predicates", "needs_details")
+
+    def __init__(self, name, action, reason, predicates, needs_details):
+        self.name = name
+        self.action = action
+        self.reason = reason
+        self.predicates = predicates
+        self.needs_details = needs_details
+
+    def matches(self, facts) -> bool:
+        for predicate in self.predicates:
+            if not predicate(facts):
+                return False
+        return True
+
+    def decide(self, status) -> str:
+        return ACTIONS[self.action](status)
+
+class RuleSet:
+    """
+    Rules from config compiled once per config version. `match` returns
+    the first rule whose conditions all hold, or None to fall back to the
+    built-in provider check.
+    """
+
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+        self.needs_details = any(rule.needs_details for rule in self.rules)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def match(self, facts):
+        for rule in self.rules:
+            if rule.matches(facts):
+                return rule
+        return None
+
+    def explain(self, facts):
+        """Evaluate every rule, not just up to the first match, with timings in microseconds."""
+        results = []
+        for rule in self.rules:
+            start = time.perf_counter()
+            matched = rule.matches(facts)
+            results.append((rule, matched, (time.perf_counter() - start) * 1e6))
+        return results
+
+# --- Compilation ---
+
+def _as_list(value):
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+def _parse_date(name, field, value):
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise RuleError(f"Rule '{name}': {field} must be a YYYY-MM-DD date, got {value!r}") from None
+
+def _number(name, field, value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise RuleError(f"Rule '{name}': {field} must be a number, got {value!r}")
+    return value
+
+def _release_date(facts):
+    value = facts.details.get("release_date")
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+def _compile_rule(index, raw, matcher, configured_regions):
+    if not isinstance(raw, dict):
+        raise RuleError(f"Rule {index + 1} must be an object")
+    name = str(raw.get("name") or f"rule {index + 1}")
+    action = raw.get("action")
+    if action not in ACTIONS:
+        raise RuleError(f"Rule '{name}': action must be one of {', '.join(ACTIONS)}, got {action!r}")
+    when = raw.get("when") or {}
+    if not isinstance(when, dict):
+        raise RuleError(f"Rule '{name}': when must be an object")
+
+    unknown = set(when) - set(CONDITIONS)
+    if unknown:
+        raise RuleError(f"Rule '{name}': unknown condition(s) {', '.join(sorted(unknown))}")
+
+    regions = tuple(configured_regions)
+    if "regions" in when:
+        regions = tuple(str(r).upper() for r in _as_list(when["regions"]))
+        missing = [r for r in regions if r not in configured_regions]
+        if missing:
+            raise RuleError(f"Rule '{name}': region(s) {', '.join(missing)} not in REGIONS")
+
+    predicates = []
+    needs_details = False
+    # Built in CONDITIONS order, which puts request fields before provider checks before TMDb details
+    for field, (builder, uses_details) in CONDITIONS.items():
+        if field in when and builder is not None:
+            predicates.append(builder(name, field, when[field], regions=regions, matcher=matcher))
+            needs_details |= uses_details
+    return Rule(name, action, raw.get("reason"), predicates, needs_details)
+
+def compile_rules(raw_rules, matcher, regions):
+    """Compile the RULES list from config. Raises RuleError on the first invalid rule."""
+    if not isinstance(raw_rules, list):
+        raise RuleError("RULES must be a list")
+    rules = [
+        _compile_rule(i, raw, matcher, regions)
+        for i, raw in enumerate(raw_rules)
+        if not (isinstance(raw, dict) and raw.get("enabled") is False)
+    ]
+    return RuleSet(rules)
+
+# --- Conditions: each builder returns a predicate over Facts ---
+
+def _media_type(name, field, value, **_):
+    allowed = frozenset(str(v).lower() for v in _as_list(value))
+    unknown = allowed - {"movie", "tv"}
+    if unknown:
+        raise RuleError(f"Rule '{name}': media_type must be movie or tv, got {', '.join(sorted(unknown))}")
+    return lambda facts: facts.media_type in allowed
+
+def _status(name, field, value, **_):
+    try:
+        allowed = frozenset(STATUS_NAMES[str(v).lower()] for v in _as_list(value))
+    except KeyError:
+        raise RuleError(f"Rule '{name}': status must be pending or approved, got {value!r}") from None
+    return lambda facts: facts.status in allowed
+
+def _requested_by(name, field, value, **_):
+    users = frozenset(str(v).lower() for v in _as_list(value))
+    return lambda facts: not users.isdisjoint(facts.requested_by)
+
+def _matched(name, field, value, regions, matcher, **_):
+    if not isinstance(value, bool):
+        raise RuleError(f"Rule '{name}': matched must be true or false")
+    return lambda facts: any(matcher.matches(p) for p in facts.providers(regions)) is value
+
+def _providers_any(name, field, value, regions, **_):
+    wanted = ProviderMatcher(_as_list(value))
+    return lambda facts: any(wanted.matches(p) for p in facts.providers(regions))
+
+def _providers_none(name, field, value, regions, **_):
+    unwanted = ProviderMatcher(_as_list(value))
+    return lambda facts: not any(unwanted.matches(p) for p in facts.providers(regions))
+
+def _released_after(name, field, value, **_):
+    after = _parse_date(name, field, value)
+    return lambda facts: (released := _release_date(facts)) is not None and released >= after
+
+def _released_before(name, field, value, **_):
+    before = _parse_date(name, field, value)
+    return lambda facts: (released := _release_date(facts)) is not None and released < before
+
+def _released_within_days(name, field, value, **_):
+    days = timedelta(days=_number(name, field, value))
+    return lambda facts: (released := _release_date(facts)) is not None and date.today() - days <= released
+
+def _threshold(detail, compare):
+    def build(name, field, value, **_):
+        limit = _number(name, field, value)
+        return lambda facts: (actual := facts.details.get(detail)) is not None and compare(actual, limit)
+    return build
+
+# field -> (predicate builder, needs TMDb title details); "regions" only scopes the provider conditions
+CONDITIONS = {
+    "media_type": (_media_type, False),
+    "status": (_status, False),
+    "requested_by": (_requested_by, False),
+    "regions": (None, False),
+    "matched": (_matched, False),
+    "providers_any": (_providers_any, False),
+    "providers_none": (_providers_none, False),
+    "released_after": (_released_after, True),
+    "released_before": (_released_before, True),
+    "released_within_days": (_released_within_days, True),
+    "min_rating": (_threshold("vote_average", lambda actual, limit: actual >= limit), True),
+    "max_rating": (_threshold("vote_average", lambda actual, limit: actual <= limit), True),
+    "min_votes": (_threshold("vote_count", lambda actual, limit: actual >= limit), True),
+}
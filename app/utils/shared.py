@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import fcntl
+import sqlite3
+import asyncio
+import threading
+from app.utils.logging import log_event
+
+# Multi-worker mode: set automatically when uvicorn is started with more than
+# one worker via WEB_CONCURRENCY, or forced with AVAILARR_SHARED_STATE=1.
+# In this mode caches, dedup windows and background schedulers are shared
+# between processes through SQLite and file locks instead of process memory.
+SHARED_STATE = (
+    int(os.getenv("WEB_CONCURRENCY", "1") or 1) > 1
+    or os.getenv("AVAILARR_SHARED_STATE", "").lower() in ("1", "true", "yes")
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dedup (
+    key TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+class FileLock:
+    """
+    Advisory lock on a file, exclusive across processes and threads.
+    Usable as a blocking context manager or via `acquire(blocking=False)`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._thread_lock = threading.Lock()
+
+    def acquire(self, blocking=True) -> bool:
+        if not self._thread_lock.acquire(blocking):
+            return False
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                self._thread_lock.release()
+                return False
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            fd, self._fd = self._fd, None
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+            self._thread_lock.release()
+
+    @property
+    def held(self):
+        return self._fd is not None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class SharedStore:
+    """
+    SQLite (WAL) state shared by all worker processes: a TTL cache, a
+    dedup window and short leases that stop several workers from fetching
+    the same key at once.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # --- Cache ---
+
+    def cache_get(self, key):
+        """Return (value, seconds left) or None if missing or expired."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        remaining = row[1] - time.time()
+        return (json.loads(row[0]), remaining) if remaining > 0 else None
+
+    def cache_set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, separators=(",", ":")), time.time() + ttl),
+            )
+
+    def cache_clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM cache")
+
+    # --- Leases ---
+
+    def lease(self, key, ttl) -> bool:
+        """Take the lease on `key` for `ttl` seconds unless another live holder has it."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            before = conn.total_changes
+            conn.execute(
+                "INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.expires_at <= ?",
+                (key, os.getpid(), now + ttl, now),
+            )
+            return conn.total_changes > before
+
+    def release(self, key):
+        with self._lock:
+            self._connect().execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, os.getpid()))
+
+    # --- Dedup ---
+
+    def dedup_seen(self, key, window) -> bool:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            before = conn.total_changes
+            conn.execute(
+                "INSERT INTO dedup (key, expires_at) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at WHERE dedup.expires_at <= ?",
+                (key, now + window, now),
+            )
+            return conn.total_changes == before
+
+    def purge(self) -> int:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            before = conn.total_changes
+            for table in ("cache", "dedup", "leases"):
+                conn.execute(f"DELETE FROM {table} WHERE expires_at <= ?", (now,))
+            return conn.total_changes - before
+
+    def stats(self):
+        if not self.enabled:
+            return {"enabled": False}
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            counts = {
+                table: conn.execute(f"SELECT COUNT(*) FROM {table} WHERE expires_at > ?", (now,)).fetchone()[0]
+                for table in ("cache", "dedup", "leases")
+            }
+        return {"enabled": True, "path": self.path, **counts}
+
+class SharedDedupWindow:
+    """DedupWindow backed by a SharedStore so every worker sees the same keys."""
+
+    def __init__(self, store, window=60.0):
+        self.store = store
+        self.window = window
+        self.duplicates = 0
+
+    def seen(self, key) -> bool:
+        duplicate = self.store.dedup_seen(json.dumps(key), self.window)
+        if duplicate:
+            self.duplicates += 1
+        return duplicate
+
+    def stats(self):
+        return {"window": self.window, "shared": True, "duplicates": self.duplicates}
+
+# Opened by init_shared_state() only in multi-worker mode
+shared_store = SharedStore()
+_janitor = None
+
+def init_shared_state(path):
+    if SHARED_STATE:
+        shared_store.path = path
+
+async def _purge_loop(interval):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            purged = await asyncio.to_thread(shared_store.purge)
+            if purged:
+                log_event("shared_state_purged", rows=purged)
+        except sqlite3.Error as e:
+            log_event("shared_state_error", error=str(e))
+
+def start_janitor(interval=600):
+    global _janitor
+    if shared_store.enabled:
+        _janitor = asyncio.create_task(_purge_loop(interval))
+
+async def stop_janitor():
+    if _janitor is not None:
+        _janitor.cancel()
+        await asyncio.gather(_janitor, return_exceptions=True)
+    shared_store.close()
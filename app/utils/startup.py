@@ -0,0 +1,56 @@
+import time
+from contextlib import contextmanager
+from app.utils.logging import log_event
+
+class StartupProfile:
+    """
+    Wall-clock timings of the startup path, from the import of main.py to
+    the end of cache warming. `mark` closes a span that started at the
+    previous mark; `phase` times a block. /healthz reports "warming" until
+    `finish` is called.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last_mark = self.started
+        self.phases = {}
+        self.ready = False
+        self.total_ms = None
+        self.budget_ms = None
+
+    @staticmethod
+    def _ms(seconds):
+        return round(seconds * 1000, 1)
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases[name] = self._ms(now - self._last_mark)
+        self._last_mark = now
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self._ms(time.perf_counter() - start)
+            self._last_mark = time.perf_counter()
+
+    def finish(self, budget_ms=None):
+        self.total_ms = self._ms(time.perf_counter() - self.started)
+        self.budget_ms = budget_ms
+        self.ready = True
+        log_event("startup_profile", total_ms=self.total_ms, budget_ms=budget_ms, phases=self.phases)
+        if budget_ms and self.total_ms > budget_ms:
+            slowest = max(self.phases, key=self.phases.get)
+            log_event("startup_over_budget", total_ms=self.total_ms, budget_ms=budget_ms, slowest_phase=slowest)
+
+    def report(self):
+        return {
+            "ready": self.ready,
+            "total_ms": self.total_ms,
+            "budget_ms": self.budget_ms,
+            "phases": dict(self.phases),
+        }
+
+startup_profile = StartupProfile()
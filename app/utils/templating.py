@@ -0,0 +1,50 @@
+import os
+import hashlib
+import threading
+
+APP_DIR = os.path.dirname(os.path.dirname(__file__))
+TEMPLATES_DIR = os.path.join(APP_DIR, "templates")
+STATIC_DIR = os.path.join(APP_DIR, "static")
+
+# One Jinja environment for every HTML route, built on first use; jinja2
+# is only imported then, which keeps it off the import path of main.py
+_templates = None
+_templates_lock = threading.Lock()
+
+def asset_version(directory=STATIC_DIR):
+    """Short fingerprint of the static files, appended to asset URLs to bust caches on upgrade."""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            digest.update(f"{os.path.relpath(path, directory)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()[:12]
+
+def get_templates():
+    global _templates
+    if _templates is None:
+        with _templates_lock:
+            if _templates is None:
+                import jinja2
+                from fastapi.templating import Jinja2Templates
+                # Templates ship with the image, so skip the per-render mtime check
+                env = jinja2.Environment(
+                    loader=jinja2.FileSystemLoader(TEMPLATES_DIR), autoescape=True, auto_reload=False
+                )
+                templates = Jinja2Templates(env=env)
+                templates.env.globals["asset_version"] = asset_version()
+                _templates = templates
+    return _templates
+
+def template_response(name, context, **kwargs):
+    return get_templates().TemplateResponse(context["request"], name, context, **kwargs)
+
+def precompile_templates() -> int:
+    """Compile every template into the environment's cache so first renders don't pay for it."""
+    env = get_templates().env
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    return len(names)
@@ -1,5 +1,291 @@
-import logging
+import os
+import sys
+import time
+import json
+import asyncio
+from datetime import datetime, timedelta, timezone
+import httpx
+from app.utils.cache import TTLCache
+from app.utils.coalesce import SingleFlight
+from app.utils.http import request, get_tmdb_headers
+from app.utils.logging import log_event
+from app.utils.metrics import CACHE_LOOKUPS, register_gauges
+from app.utils.provider_index import ProviderIndex
+from app.utils.shared import SHARED_STATE, shared_store
 
-def get_streaming_providers(tmdb_id, media_type):
-    logging.info(f"Mock TMDb lookup for {media_type} ID {tmdb_id}")
-    return ["Netflix", "Prime Video"]  # Example return for testing
+# Overridable so the benchmark harness can point Availarr at a local stand-in
+TMDB_API_URL = os.getenv("TMDB_API_URL", "https://api.themoviedb.org/3").rstrip("/")
+
+# Offer types TMDb reports per region in a watch/providers response
+MONETIZATION_TYPES = ("flatrate", "free", "ads", "rent", "buy")
+
+# Parsed watch-provider availability keyed by (media_type, tmdb_id)
+provider_cache = TTLCache(maxsize=2048)
+# Concurrent cache misses for the same key share one TMDb request
+provider_lookups = SingleFlight()
+# Release date and rating per (media_type, tmdb_id), only fetched when a rule uses them
+title_details_cache = TTLCache(maxsize=2048)
+detail_lookups = SingleFlight()
+# Optional local mirror consulted before TMDb on a cache miss
+provider_index = ProviderIndex()
+_index_refresher = None
+
+class ProviderLookupError(Exception):
+    """TMDb could not be reached or answered with an error; availability is unknown."""
+
+def _cache_gauges():
+    stats = provider_cache.stats()
+    return [
+        ("availarr_cache_hit_ratio", "Cache hit ratio since start", ("cache",), {("tmdb_providers",): stats["hit_ratio"]}),
+        ("availarr_cache_entries", "Entries currently cached", ("cache",), {("tmdb_providers",): stats["size"]}),
+    ]
+
+register_gauges(_cache_gauges)
+
+def init_provider_cache(config, path=None):
+    provider_cache.configure(
+        maxsize=int(config.get("TMDB_CACHE_SIZE", 2048)),
+        # With several workers the shared store already persists lookups
+        path=path if config.get("TMDB_CACHE_PERSIST", True) and not SHARED_STATE else None,
+    )
+    provider_cache.load()
+
+def init_provider_index(config, path):
+    if not config.get("PROVIDER_INDEX_ENABLED", False):
+        return
+    provider_index.path = path
+    provider_index.max_age = float(config.get("PROVIDER_INDEX_MAX_AGE", 168)) * 3600
+    log_event("provider_index_enabled", path=path)
+
+def get_regions(config):
+    return [r.upper() for r in config.get("REGIONS") or ["US"]]
+
+def get_monetization_types(config):
+    return [t for t in config.get("MONETIZATION_TYPES") or ["flatrate"] if t in MONETIZATION_TYPES]
+
+def parse_availability(data, regions):
+    """
+    Reduce a TMDb watch/providers response to the compact per-title form
+    cached and indexed by Availarr: {region: {monetization_type: [names]}}.
+    Every requested region gets an entry, even if TMDb has nothing for it,
+    so callers can tell which regions a stored value covers.
+    """
+    results = data.get("results", {})
+    availability = {}
+    for region in regions:
+        offers = results.get(region, {})
+        availability[region] = {
+            kind: [sys.intern(p["provider_name"]) for p in offers[kind]]
+            for kind in MONETIZATION_TYPES if offers.get(kind)
+        }
+    return availability
+
+def select_providers(availability, regions, monetization_types):
+    """Flatten the configured regions and monetization types into one de-duplicated provider list."""
+    seen = {}
+    for region in regions:
+        offers = availability.get(region, {})
+        for kind in monetization_types:
+            for name in offers.get(kind, ()):
+                seen.setdefault(name, None)
+    return list(seen)
+
+def _covers(availability, regions):
+    return availability is not None and all(region in availability for region in regions)
+
+async def fetch_availability(api_key, tmdb_id, media_type, regions):
+    url = f"{TMDB_API_URL}/{media_type}/{tmdb_id}/watch/providers"
+
+    log_event("tmdb_query", url=url, media_type=media_type, tmdb_id=tmdb_id)
+    response = await request("GET", url, headers=get_tmdb_headers(api_key))
+    response.raise_for_status()
+    availability = parse_availability(response.json(), regions)
+    log_event("tmdb_response", tmdb_id=tmdb_id, availability=availability)
+    return availability
+
+async def _lookup_availability(config, tmdb_id, media_type, regions):
+    if provider_index.enabled:
+        indexed = await asyncio.to_thread(provider_index.get, media_type, tmdb_id)
+        if _covers(indexed, regions):
+            return indexed
+    availability = await fetch_availability(config["TMDB_API_KEY"], tmdb_id, media_type, regions)
+    if provider_index.enabled:
+        await asyncio.to_thread(provider_index.put, media_type, tmdb_id, availability)
+    return availability
+
+def _cache_ttl(config, availability, regions):
+    if any(availability.get(region) for region in regions):
+        return float(config.get("TMDB_CACHE_TTL", 21600))
+    return float(config.get("TMDB_CACHE_NEGATIVE_TTL", 300))
+
+async def _lookup_shared(config, key, tmdb_id, media_type, regions, wait=10.0):
+    # One worker holds the lease and fetches; the others poll the shared cache for its answer
+    shared_key = json.dumps(key)
+    deadline = time.monotonic() + wait
+    leased = await asyncio.to_thread(shared_store.lease, f"tmdb:{shared_key}", wait)
+    while not leased and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        shared = await asyncio.to_thread(shared_store.cache_get, shared_key)
+        if shared is not None and _covers(shared[0], regions):
+            return shared[0]
+        leased = await asyncio.to_thread(shared_store.lease, f"tmdb:{shared_key}", wait)
+    try:
+        availability = await _lookup_availability(config, tmdb_id, media_type, regions)
+        await asyncio.to_thread(shared_store.cache_set, shared_key, availability, _cache_ttl(config, availability, regions))
+        return availability
+    finally:
+        if leased:
+            await asyncio.to_thread(shared_store.release, f"tmdb:{shared_key}")
+
+async def get_availability(config, tmdb_id, media_type):
+    regions = get_regions(config)
+    key = (media_type, str(tmdb_id))
+    cached = provider_cache.get(key, None)
+    if _covers(cached, regions):
+        CACHE_LOOKUPS.inc("tmdb_providers", "hit")
+        log_event("tmdb_cache_hit", tmdb_id=tmdb_id, media_type=media_type)
+        return cached
+
+    if shared_store.enabled:
+        shared = await asyncio.to_thread(shared_store.cache_get, json.dumps(key))
+        if shared is not None and _covers(shared[0], regions):
+            provider_cache.set(key, shared[0], shared[1])
+            CACHE_LOOKUPS.inc("tmdb_providers", "hit")
+            log_event("tmdb_cache_hit", tmdb_id=tmdb_id, media_type=media_type, shared=True)
+            return shared[0]
+        lookup = lambda: _lookup_shared(config, key, tmdb_id, media_type, regions)
+    else:
+        lookup = lambda: _lookup_availability(config, tmdb_id, media_type, regions)
+    CACHE_LOOKUPS.inc("tmdb_providers", "miss")
+
+    try:
+        availability = await provider_lookups.do(key, lookup)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code != 404:
+            log_event("tmdb_error", tmdb_id=tmdb_id, error=str(e))
+            raise ProviderLookupError(str(e)) from e
+        # TMDb doesn't know the title: a real answer, so cache it as "nowhere"
+        availability = {region: {} for region in regions}
+    except (httpx.HTTPError, ValueError) as e:
+        # Never cache or act on a failed lookup as if the title were unavailable
+        log_event("tmdb_error", tmdb_id=tmdb_id, error=str(e))
+        raise ProviderLookupError(str(e)) from e
+
+    provider_cache.set(key, availability, _cache_ttl(config, availability, regions))
+    return availability
+
+async def fetch_title_details(api_key, tmdb_id, media_type):
+    url = f"{TMDB_API_URL}/{media_type}/{tmdb_id}"
+    response = await request("GET", url, headers=get_tmdb_headers(api_key))
+    response.raise_for_status()
+    data = response.json()
+    return {
+        # TV shows have a first air date instead of a release date
+        "release_date": data.get("release_date") or data.get("first_air_date") or None,
+        "vote_average": data.get("vote_average"),
+        "vote_count": data.get("vote_count"),
+    }
+
+async def get_title_details(config, tmdb_id, media_type):
+    key = (media_type, str(tmdb_id))
+    cached = title_details_cache.get(key, None)
+    if cached is not None:
+        CACHE_LOOKUPS.inc("tmdb_title_details", "hit")
+        return cached
+    CACHE_LOOKUPS.inc("tmdb_title_details", "miss")
+    try:
+        details = await detail_lookups.do(key, lambda: fetch_title_details(config["TMDB_API_KEY"], tmdb_id, media_type))
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code != 404:
+            log_event("tmdb_error", tmdb_id=tmdb_id, error=str(e))
+            raise ProviderLookupError(str(e)) from e
+        details = {"release_date": None, "vote_average": None, "vote_count": None}
+    except (httpx.HTTPError, ValueError) as e:
+        log_event("tmdb_error", tmdb_id=tmdb_id, error=str(e))
+        raise ProviderLookupError(str(e)) from e
+    title_details_cache.set(key, details, float(config.get("TMDB_CACHE_TTL", 21600)))
+    return details
+
+# --- Provider index refresh (TMDb changes feeds) ---
+
+async def fetch_changed_ids(api_key, media_type, start_date, end_date):
+    url = f"{TMDB_API_URL}/{media_type}/changes"
+    ids = []
+    page = 1
+    while True:
+        params = {"start_date": start_date, "end_date": end_date, "page": page}
+        response = await request("GET", url, headers=get_tmdb_headers(api_key), params=params)
+        response.raise_for_status()
+        data = response.json()
+        ids.extend(item["id"] for item in data.get("results", []) if "id" in item)
+        if page >= data.get("total_pages", 1):
+            return ids
+        page += 1
+
+async def fetch_watch_providers(api_key, media_type, region=None):
+    """TMDb's list of watch providers for `media_type`, optionally limited to one region."""
+    url = f"{TMDB_API_URL}/watch/providers/{media_type}"
+    params = {"watch_region": region} if region else {}
+    response = await request("GET", url, headers=get_tmdb_headers(api_key), params=params)
+    response.raise_for_status()
+    return response.json().get("results", [])
+
+async def refresh_provider_index(config, limit=500, concurrency=4):
+    """
+    Mark indexed titles changed since the last sync as stale, then re-fetch
+    stale and expired entries. TMDb only serves 14 days of changes.
+    """
+    api_key = config["TMDB_API_KEY"]
+    today = datetime.now(timezone.utc).date()
+    last_sync = await asyncio.to_thread(provider_index.get_meta, "last_sync")
+    start = today - timedelta(days=1)
+    if last_sync:
+        start = max(datetime.fromisoformat(last_sync).date(), today - timedelta(days=14))
+
+    marked = 0
+    for media_type in ("movie", "tv"):
+        changed = await fetch_changed_ids(api_key, media_type, start.isoformat(), today.isoformat())
+        marked += await asyncio.to_thread(provider_index.mark_stale, media_type, changed)
+
+    due = await asyncio.to_thread(provider_index.due_for_refresh, limit)
+    semaphore = asyncio.Semaphore(concurrency)
+    ttl = float(config.get("TMDB_CACHE_TTL", 21600))
+
+    regions = get_regions(config)
+
+    async def refresh(media_type, tmdb_id):
+        async with semaphore:
+            try:
+                availability = await fetch_availability(api_key, tmdb_id, media_type, regions)
+            except (httpx.HTTPError, ValueError) as e:
+                log_event("provider_index_refresh_failed", tmdb_id=tmdb_id, error=str(e))
+                return
+        await asyncio.to_thread(provider_index.put, media_type, tmdb_id, availability)
+        provider_cache.set((media_type, str(tmdb_id)), availability, ttl)
+        if shared_store.enabled:
+            await asyncio.to_thread(shared_store.cache_set, json.dumps((media_type, str(tmdb_id))), availability, ttl)
+
+    await asyncio.gather(*[refresh(*row) for row in due])
+    await asyncio.to_thread(provider_index.set_meta, "last_sync", today.isoformat())
+    log_event("provider_index_refreshed", since=start.isoformat(), marked_stale=marked, refreshed=len(due))
+
+async def _index_refresh_loop(load_config):
+    while True:
+        config = load_config()
+        try:
+            if config.get("TMDB_API_KEY"):
+                await refresh_provider_index(config)
+        except Exception as e:
+            log_event("provider_index_error", error=str(e))
+        await asyncio.sleep(float(config.get("PROVIDER_INDEX_REFRESH_INTERVAL", 360)) * 60)
+
+def start_index_refresher(load_config):
+    global _index_refresher
+    if provider_index.enabled:
+        _index_refresher = asyncio.create_task(_index_refresh_loop(load_config))
+
+async def stop_index_refresher():
+    if _index_refresher is not None:
+        _index_refresher.cancel()
+        await asyncio.gather(_index_refresher, return_exceptions=True)
+    provider_index.close()
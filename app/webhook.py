@@ -1,12 +1,44 @@
+import os
+import asyncio
 import logging
-import requests
 from fastapi import APIRouter, Request
-from app.config_server import load_config
-from app.utils.normalization import normalize_provider
+from fastapi.responses import JSONResponse
+from app.config_server import load_config, get_config_version, CONFIG_DIR
+from app.utils.normalization import ProviderMatcher
+from app.utils.rules import RuleSet, RuleError, Facts, compile_rules
 from app.utils.logging import log_event
+from app.utils.tmdb import (
+    get_availability, get_title_details, get_regions, get_monetization_types, select_providers, ProviderLookupError
+)
+from app.utils.overseerr import approve_request, decline_pending_request, delete_approved_request
+from app.utils.discord import send_discord_notification, send_review_notification, send_approval_notification
+from app.utils.coalesce import DedupWindow
+from app.utils.shared import SHARED_STATE, SharedDedupWindow, shared_store
+from app.utils.jobs import JobQueue, WorkerPool
+from app.utils.history import DecisionHistory
+from app.utils.metrics import WEBHOOKS, STAGE_LATENCY
 
 router = APIRouter()
 
+# Overseerr can fire the same webhook more than once; drop repeats within the window.
+# With several workers the window lives in the shared store so any worker catches a repeat.
+recent_webhooks = SharedDedupWindow(shared_store) if SHARED_STATE else DedupWindow()
+
+# Webhooks are persisted here and processed by background workers
+job_queue = JobQueue(os.path.join(CONFIG_DIR, "queue.db"))
+worker_pool = None
+
+# Every decision, for the /history API
+decision_history = DecisionHistory(os.path.join(CONFIG_DIR, "history.db"))
+
+# Provider matcher and decision rules rebuilt only when the config snapshot changes
+_matcher = None
+_rules = RuleSet()
+_matcher_version = None
+
+class ActionFailed(Exception):
+    """An Overseerr action failed; raised so the job queue retries the webhook."""
+
 def get_required_config():
     config = load_config()
     required_keys = ["TMDB_API_KEY", "OVERSEERR_URL", "OVERSEERR_API_KEY", "DISCORD_WEBHOOK_URL"]
@@ -15,115 +47,152 @@ def get_required_config():
         raise EnvironmentError(f"Missing required config values: {', '.join(missing)}")
     return config
 
-def get_streaming_providers(tmdb_id, media_type):
-    config = get_required_config()
-    TMDB_API_KEY = config["TMDB_API_KEY"]
-    region = "US"
-    url = f"https://api.themoviedb.org/3/{media_type}/{tmdb_id}/watch/providers"
-    headers = {"Authorization": f"Bearer {TMDB_API_KEY}"}
-
-    log_event("tmdb_query", url=url, media_type=media_type, tmdb_id=tmdb_id)
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        providers = [
-            provider["provider_name"]
-            for provider in data.get("results", {}).get(region, {}).get("flatrate", [])
-        ]
-        log_event("tmdb_response", tmdb_id=tmdb_id, providers=sorted(providers))
-        return providers
-    except requests.RequestException as e:
-        log_event("tmdb_error", tmdb_id=tmdb_id, error=str(e))
-        return []
-
-def delete_approved_request(request_id):
-    config = get_required_config()
-    url = f"{config['OVERSEERR_URL']}/api/v1/request/{request_id}"
-    headers = {"X-Api-Key": config['OVERSEERR_API_KEY']}
-    try:
-        response = requests.delete(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        log_event("request_deleted", request_id=request_id)
-    except requests.RequestException as e:
-        log_event("request_delete_failed", request_id=request_id, error=str(e))
-
-def decline_pending_request(request_id):
-    config = get_required_config()
-    url = f"{config['OVERSEERR_URL']}/api/v1/request/{request_id}/decline"
-    headers = {"X-Api-Key": config['OVERSEERR_API_KEY']}
-    try:
-        response = requests.post(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        log_event("request_declined", request_id=request_id)
-    except requests.RequestException as e:
-        log_event("request_decline_failed", request_id=request_id, error=str(e))
-
-def approve_request(request_id):
-    config = get_required_config()
-    url = f"{config['OVERSEERR_URL']}/api/v1/request/{request_id}/approve"
-    headers = {"X-Api-Key": config['OVERSEERR_API_KEY']}
-    try:
-        response = requests.post(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        log_event("request_approved", request_id=request_id)
-    except requests.RequestException as e:
-        log_event("request_approval_failed", request_id=request_id, error=str(e))
-
-def send_discord_notification(title, request_id, available_on, reason, action):
-    config = get_required_config()
-    content = (
-        f"**{title}** (Request ID: {request_id}) was **{action}** "
-        f"because it is available on: {', '.join(available_on)}.\nReason: {reason}"
+def get_provider_matcher() -> ProviderMatcher:
+    global _matcher, _rules, _matcher_version
+    version = get_config_version()
+    if _matcher is None or version != _matcher_version:
+        config = load_config()
+        _matcher = ProviderMatcher(config.get("PROVIDERS", []))
+        try:
+            _rules = compile_rules(config.get("RULES", []), _matcher, get_regions(config))
+        except RuleError as e:
+            # A hand-edited config with a bad rule falls back to the built-in decision
+            _rules = RuleSet()
+            log_event("rules_invalid", level=logging.ERROR, error=str(e))
+        _matcher_version = version
+        log_event("provider_matcher_built", version=version, allowed=sorted(_matcher.allowed), rules=len(_rules))
+    return _matcher
+
+def get_rules() -> RuleSet:
+    get_provider_matcher()
+    return _rules
+
+async def start_workers():
+    global worker_pool
+    config = load_config()
+    worker_pool = WorkerPool(
+        job_queue,
+        {"webhook": process_webhook},
+        concurrency=int(config.get("WEBHOOK_WORKERS", 4)),
+        max_attempts=int(config.get("JOB_MAX_ATTEMPTS", 5)),
+        backoff=float(config.get("JOB_RETRY_BACKOFF", 5)),
+        # Other workers' running jobs are only reclaimed once they look abandoned
+        recover_after=float(config.get("JOB_LEASE_TIMEOUT", 300)) if SHARED_STATE else None,
     )
-    payload = {"content": content}
+    await worker_pool.start()
+
+async def stop_workers():
+    if worker_pool is not None:
+        await worker_pool.stop()
+    job_queue.close()
+
+# Webhook status codes: 1 = approved, 2 = pending
+def decide_action(status, matched) -> str:
+    """Return "deleted", "declined", "approved" or "review" for a request."""
+    if matched:
+        return "deleted" if status == 1 else "declined"
+    return "approved" if status == 2 else "review"
+
+async def apply_action(config, action, request_id) -> bool:
+    if action == "deleted":
+        return await delete_approved_request(config, request_id)
+    if action == "declined":
+        return await decline_pending_request(config, request_id)
+    if action == "approved":
+        return await approve_request(config, request_id)
+    return True
+
+async def evaluate_request(config, tmdb_id, media_type, status, title=None, requested_by=(), rules=None) -> dict:
+    """
+    Return the action for a request with the matched/unmatched providers,
+    the rule that decided it (None for the built-in provider check) and
+    stage latencies behind it.
+    """
+    rules = get_rules() if rules is None else rules
+    with STAGE_LATENCY.time("tmdb_lookup") as lookup:
+        availability = await get_availability(config, tmdb_id, media_type)
+        details = await get_title_details(config, tmdb_id, media_type) if rules.needs_details else None
+    monetization_types = get_monetization_types(config)
+    with STAGE_LATENCY.time("provider_match") as match:
+        providers = select_providers(availability, get_regions(config), monetization_types)
+        matched, unmatched = get_provider_matcher().match(providers)
+    with STAGE_LATENCY.time("rules") as ruling:
+        facts = Facts(media_type, status, requested_by, availability, monetization_types, details)
+        rule = rules.match(facts) if rules else None
+    action = rule.decide(status) if rule else decide_action(status, matched)
+    log_event("provider_match", matched_providers=sorted(matched), unmatched_providers=sorted(unmatched), title=title,
+              rule=rule.name if rule else None)
+    return {
+        "action": action,
+        "matched": matched,
+        "unmatched": unmatched,
+        "rule": rule.name if rule else None,
+        "reason": rule.reason if rule else None,
+        "latency_ms": {"tmdb_lookup": _ms(lookup.elapsed), "provider_match": _ms(match.elapsed), "rules": _ms(ruling.elapsed)},
+    }
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+# Failures are only counted and recorded on the last attempt, so a request
+# that keeps failing shows up once rather than once per retry
+async def process_webhook(job, final=True):
     try:
-        response = requests.post(config['DISCORD_WEBHOOK_URL'], json=payload, timeout=10)
-        response.raise_for_status()
-        log_event("discord_notify_success", request_id=request_id)
-    except requests.RequestException as e:
-        log_event("discord_notify_failed", request_id=request_id, error=str(e))
-
-def send_review_notification(title, request_id, reason):
-    config = get_required_config()
-    overseerr_url = config["OVERSEERR_URL"].rstrip("/")
-    request_link = f"{overseerr_url}/requests/{request_id}"
-    content = (
-        f"⚠️ **Manual Review Needed**\n"
-        f"**{title}** (Request ID: `{request_id}`) is awaiting manual approval.\n"
-        f"⛔ **Reason:** {reason}\n"
-        f"▶ [Open in Overseerr]({request_link})"
+        await _process_webhook(job)
+    except ProviderLookupError as e:
+        # Availability unknown: leave the request alone and let the queue retry later
+        log_event("decision_deferred", request_id=job["request_id"], tmdb_id=job["tmdb_id"], error=str(e), final=final)
+        if final:
+            WEBHOOKS.inc("deferred")
+            _record(job, "deferred", error=str(e))
+        raise
+    except Exception as e:
+        if final:
+            WEBHOOKS.inc("errored")
+            _record(job, "errored", error=str(e))
+        raise
+
+def _record(job, action, **details):
+    decision_history.record(
+        "webhook", action, request_id=job["request_id"], tmdb_id=job["tmdb_id"],
+        media_type=job["media_type"], title=job["title"], status=job["status"], **details,
     )
-    payload = {"content": content}
-    try:
-        response = requests.post(config['DISCORD_WEBHOOK_URL'], json=payload, timeout=10)
-        response.raise_for_status()
-        log_event("review_notify_success", request_id=request_id)
-    except requests.RequestException as e:
-        log_event("review_notify_failed", request_id=request_id, error=str(e))
 
-def send_approval_notification(title, request_id):
+async def _process_webhook(job):
     config = get_required_config()
-    overseerr_url = config["OVERSEERR_URL"].rstrip("/")
-    request_link = f"{overseerr_url}/requests/{request_id}"
-    content = (
-        f"✅ **Auto-Approved Request**\n"
-        f"**{title}** (Request ID: `{request_id}`) has been automatically approved because it is **not available** on any of your selected streaming platforms.\n"
-        f"▶ [View in Overseerr]({request_link})"
+    title = job["title"]
+    request_id = job["request_id"]
+
+    decision = await evaluate_request(
+        config, job["tmdb_id"], job["media_type"], job["status"], title, job.get("requested_by") or ()
     )
-    payload = {"content": content}
-    try:
-        response = requests.post(config['DISCORD_WEBHOOK_URL'], json=payload, timeout=10)
-        response.raise_for_status()
-        log_event("approval_notify_success", request_id=request_id)
-    except requests.RequestException as e:
-        log_event("approval_notify_failed", request_id=request_id, error=str(e))
+    action, matched = decision["action"], decision["matched"]
+
+    with STAGE_LATENCY.time("overseerr_action") as overseerr:
+        applied = await apply_action(config, action, request_id)
+    if not applied:
+        raise ActionFailed(f"Could not apply '{action}' to request {request_id}")
+    WEBHOOKS.inc(action)
+    decision["latency_ms"]["overseerr_action"] = _ms(overseerr.elapsed)
+    log_event("decision", request_id=request_id, tmdb_id=job["tmdb_id"], title=title, action=action,
+              rule=decision["rule"], matched_providers=sorted(matched))
+    _record(job, action, matched=matched, unmatched=decision["unmatched"], latency_ms=decision["latency_ms"])
+
+    if action in ("deleted", "declined"):
+        reason = decision["reason"] or "Title is already available on a preferred streaming platform"
+        send_discord_notification(config, title, request_id, sorted(matched), reason, action)
+    elif action == "approved":
+        send_approval_notification(config, title, request_id)
+    else:
+        reason = decision["reason"] or "Title not found on any preferred provider. Awaiting manual approval."
+        send_review_notification(config, title, request_id, reason)
 
 @router.post("")
 async def handle_webhook(request: Request):
     try:
         payload = await request.json()
-        log_event("webhook_received", payload=payload)
+        WEBHOOKS.inc("received")
+        log_event("webhook_payload", level=logging.DEBUG, payload=payload)
 
         event_type = payload.get("event")
         media = payload.get("media", {})
@@ -133,57 +202,50 @@ async def handle_webhook(request: Request):
         tmdb_id = media.get("tmdbId")
         title = payload.get("subject") or media.get("title", "Unknown Title")
         request_id = request_data.get("request_id")
+        requested_by = [request_data.get("requestedBy_username"), request_data.get("requestedBy_email")]
         media_status = media.get("status")
         status = 2 if media_status == "PENDING" else 1 if media_status == "APPROVED" else None
 
         if not all([media_type, tmdb_id, request_id]):
             log_event("missing_fields", media_type=media_type, tmdb_id=tmdb_id, request_id=request_id)
+            WEBHOOKS.inc("ignored")
             return {"message": "Missing required fields. Ignored."}
 
         if status not in [1, 2]:
             log_event("invalid_status", status=media_status, request_id=request_id)
+            WEBHOOKS.inc("ignored")
             return {"message": "Request not approved or pending. Ignored."}
 
-        providers = get_streaming_providers(tmdb_id, media_type)
-        config = load_config()
-        allowed_providers = config.get("PROVIDERS", [])
-        normalized_allowed = [normalize_provider(p) for p in allowed_providers]
-
-        matched = set()
-        unmatched = []
-
-        for provider in providers:
-            provider_normalized = normalize_provider(provider).replace(" with ads", "").replace("standard with ads", "").replace("+", "plus")
-            match_attempts = [allowed for allowed in normalized_allowed if allowed == provider_normalized]
-            log_event("provider_match_attempt", provider=provider, normalized=provider_normalized, matches=match_attempts)
-            if match_attempts:
-                matched.add(provider)
-            else:
-                unmatched.append(provider)
-
-        log_event("provider_match", matched_providers=sorted(matched), unmatched_providers=sorted(unmatched), title=title)
-
-        if matched:
-            reason = "Title is already available on a preferred streaming platform"
-            action = "deleted" if status == 1 else "declined"
-
-            if status == 1:
-                delete_approved_request(request_id)
-            else:
-                decline_pending_request(request_id)
-
-            send_discord_notification(title, request_id, sorted(matched), reason, action)
-            return {"message": f"Request {request_id} {action} due to streaming availability."}
-
-        if status == 2:
-            approve_request(request_id)
-            send_approval_notification(title, request_id)
-            return {"message": f"Request {request_id} auto-approved due to no matching providers."}
+        log_event("webhook_received", overseerr_event=event_type, request_id=request_id, tmdb_id=tmdb_id,
+                  media_type=media_type, status=media_status)
+
+        config = get_required_config()
+        recent_webhooks.window = float(config.get("WEBHOOK_DEDUP_WINDOW", 60))
+        if SHARED_STATE:
+            duplicate = await asyncio.to_thread(recent_webhooks.seen, (str(request_id), status))
         else:
-            reason = "Title not found on any preferred provider. Awaiting manual approval."
-            send_review_notification(title, request_id, reason)
-            return {"message": f"No matching providers found. Notified for manual approval."}
+            duplicate = recent_webhooks.seen((str(request_id), status))
+        if duplicate:
+            log_event("duplicate_webhook", request_id=request_id, status=media_status)
+            WEBHOOKS.inc("duplicate")
+            return {"message": f"Duplicate webhook for request {request_id}. Ignored."}
+
+        job_id = await asyncio.to_thread(job_queue.enqueue, "webhook", {
+            "event": event_type,
+            "media_type": media_type,
+            "tmdb_id": tmdb_id,
+            "title": title,
+            "request_id": request_id,
+            "status": status,
+            "requested_by": [user for user in requested_by if user],
+        })
+        if worker_pool is not None:
+            worker_pool.notify()
+        WEBHOOKS.inc("queued")
+        log_event("webhook_queued", request_id=request_id, job_id=job_id)
+        return JSONResponse(status_code=202, content={"message": f"Request {request_id} queued for processing.", "job_id": job_id})
 
     except Exception as e:
+        WEBHOOKS.inc("errored")
         log_event("webhook_error", error=str(e))
         return {"error": str(e)}
@@ -0,0 +1,183 @@
+import time
+import random
+import socket
+import asyncio
+import threading
+from collections import Counter
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+# Providers the fake TMDb hands out; titles whose id hashes onto None are "not streaming"
+FAKE_PROVIDERS = ("Netflix", "Hulu", "Disney Plus", "Max", None, None)
+
+class Faults:
+    """Latency and error injection applied to every request a fake serves."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.injected = 0
+
+    async def apply(self):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            self.injected += 1
+            return Response(status_code=self.error_status)
+        return None
+
+class FakeService:
+    def __init__(self, name, faults):
+        self.name = name
+        self.faults = faults
+        self.calls = Counter()
+        self.port = _free_port()
+        self.app = FastAPI()
+
+        @self.app.middleware("http")
+        async def inject(request: Request, call_next):
+            self.calls[self.route_name(request)] += 1
+            error = await self.faults.apply()
+            return error if error is not None else await call_next(request)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def route_name(self, request):
+        return f"{request.method} {request.url.path}"
+
+    def stats(self):
+        return {"calls": dict(self.calls), "total": sum(self.calls.values()), "injected_errors": self.faults.injected}
+
+class FakeTMDb(FakeService):
+    def __init__(self, faults):
+        super().__init__("tmdb", faults)
+
+        @self.app.get("/3/{media_type}/changes")
+        async def changes(media_type: str):
+            return {"results": [], "page": 1, "total_pages": 1}
+
+        @self.app.get("/3/{media_type}/{tmdb_id}/watch/providers")
+        async def watch_providers(media_type: str, tmdb_id: int):
+            provider = FAKE_PROVIDERS[tmdb_id % len(FAKE_PROVIDERS)]
+            results = {"US": {"flatrate": [{"provider_name": provider}]}} if provider else {}
+            return {"id": tmdb_id, "results": results}
+
+        @self.app.get("/3/authentication")
+        async def authentication():
+            return {"success": True}
+
+    def route_name(self, request):
+        # Collapse per-title paths so the report counts endpoints, not ids
+        parts = request.url.path.split("/")
+        if parts[-1] == "providers":
+            return "GET watch/providers"
+        return super().route_name(request)
+
+class FakeOverseerr(FakeService):
+    def __init__(self, faults):
+        super().__init__("overseerr", faults)
+        # request_id -> (action, monotonic time the action arrived)
+        self.actions = {}
+
+        @self.app.post("/api/v1/request/{request_id}/{action}")
+        async def act(request_id: int, action: str):
+            self.actions.setdefault(request_id, (action, time.monotonic()))
+            return {"id": request_id}
+
+        @self.app.delete("/api/v1/request/{request_id}")
+        async def delete(request_id: int):
+            self.actions.setdefault(request_id, ("delete", time.monotonic()))
+            return Response(status_code=204)
+
+        @self.app.get("/api/v1/request")
+        async def list_requests():
+            return {"pageInfo": {"results": 0}, "results": []}
+
+        @self.app.get("/api/v1/user")
+        async def user():
+            return {"results": []}
+
+    def route_name(self, request):
+        parts = request.url.path.rstrip("/").split("/")
+        if len(parts) == 6 and parts[3] == "request":
+            return f"POST request/{parts[5]}"
+        if len(parts) == 5 and parts[3] == "request":
+            return "DELETE request"
+        return super().route_name(request)
+
+class FakeDiscord(FakeService):
+    """Accepts webhook posts and, optionally, enforces Discord's 5 per 2 s bucket."""
+
+    def __init__(self, faults, enforce_rate_limit=True):
+        super().__init__("discord", faults)
+        self.enforce_rate_limit = enforce_rate_limit
+        self.embeds = 0
+        self._window = []
+
+        @self.app.post("/api/webhooks/{hook_id}/{token}")
+        async def webhook(request: Request):
+            now = time.monotonic()
+            self._window = [t for t in self._window if now - t < 2.0]
+            if self.enforce_rate_limit and len(self._window) >= 5:
+                retry_after = round(2.0 - (now - self._window[0]), 3)
+                return JSONResponse({"retry_after": retry_after}, status_code=429, headers={"Retry-After": str(retry_after)})
+            self._window.append(now)
+            self.embeds += len((await request.json()).get("embeds", []))
+            return Response(status_code=204, headers={
+                "X-RateLimit-Remaining": str(5 - len(self._window)),
+                "X-RateLimit-Reset-After": "2.0",
+            })
+
+    @property
+    def webhook_url(self):
+        return f"{self.url}/api/webhooks/0/bench"
+
+    def route_name(self, request):
+        return "POST webhook"
+
+    def stats(self):
+        return {**super().stats(), "embeds": self.embeds}
+
+class FakeUpstreams:
+    """Runs the fake services on their own event loop in a background thread."""
+
+    def __init__(self, *services):
+        self.services = services
+        self._servers = []
+        self._thread = None
+
+    def start(self, timeout=10.0):
+        self._servers = [
+            uvicorn.Server(uvicorn.Config(s.app, host="127.0.0.1", port=s.port, log_level="warning", lifespan="off"))
+            for s in self.services
+        ]
+        for server in self._servers:
+            # Don't let uvicorn take over Ctrl+C from the benchmark runner
+            server.install_signal_handlers = lambda: None
+        self._thread = threading.Thread(target=asyncio.run, args=(self._serve(),), daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not all(server.started for server in self._servers):
+            if time.monotonic() > deadline:
+                raise RuntimeError("Fake upstream servers did not start")
+            time.sleep(0.05)
+
+    async def _serve(self):
+        await asyncio.gather(*[server.serve() for server in self._servers])
+
+    def stop(self):
+        for server in self._servers:
+            server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
@@ -0,0 +1,279 @@
+"""
+Webhook load test for Availarr.
+
+Starts local stand-ins for TMDb, Overseerr and Discord, launches Availarr
+against them (or targets an instance you already started with --target),
+fires Overseerr webhook payloads at POST /webhook at a fixed rate and
+reports latency percentiles, throughput and upstream call counts.
+
+    python -m bench.run --rate 50 --duration 20
+    python -m bench.run --payloads recorded.jsonl --tmdb-latency 0.2 --tmdb-error-rate 0.05
+    python -m bench.run --max-p99 250   # exit 1 if webhook p99 exceeds 250 ms
+"""
+import os
+import sys
+import json
+import time
+import random
+import secrets
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import Counter
+import httpx
+from bench.fakes import Faults, FakeTMDb, FakeOverseerr, FakeDiscord, FakeUpstreams, _free_port
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.run", description="Availarr webhook benchmark")
+    load = parser.add_argument_group("load")
+    load.add_argument("--rate", type=float, default=50.0, help="webhooks per second (open loop)")
+    load.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    load.add_argument("--payloads", help="JSON lines file of recorded Overseerr webhook payloads to replay")
+    load.add_argument("--keep-ids", action="store_true", help="replay recorded request ids as-is (duplicates will be deduped)")
+    load.add_argument("--titles", type=int, default=500, help="distinct TMDb ids in synthetic payloads")
+    load.add_argument("--approved-ratio", type=float, default=0.0, help="share of synthetic payloads with status APPROVED")
+    load.add_argument("--drain", type=float, default=30.0, help="seconds to wait for queued webhooks to finish")
+    load.add_argument("--seed", type=int, default=None)
+
+    target = parser.add_argument_group("target")
+    target.add_argument("--target", help="URL of a running Availarr (skips launching one; it must use the fakes' URLs)")
+    target.add_argument("--api-key", help="API key for --target (otherwise logs in with --username/--password)")
+    target.add_argument("--username", default="admin")
+    target.add_argument("--password", default="admin")
+    target.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="config.json override for the launched instance, value parsed as JSON")
+
+    faults = parser.add_argument_group("upstream faults")
+    for name in ("tmdb", "overseerr", "discord"):
+        faults.add_argument(f"--{name}-latency", type=float, default=0.0, help="seconds added to every response")
+        faults.add_argument(f"--{name}-jitter", type=float, default=0.0, help="extra uniform random latency, seconds")
+        faults.add_argument(f"--{name}-error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    faults.add_argument("--no-discord-rate-limit", action="store_true", help="don't emulate Discord's 5 per 2 s limit")
+
+    output = parser.add_argument_group("output")
+    output.add_argument("--json", action="store_true", help="print the report as JSON")
+    output.add_argument("--max-p99", type=float, default=None, help="fail (exit 1) if webhook p99 latency exceeds this many ms")
+    return parser.parse_args(argv)
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+def summarize(values):
+    ms = [v * 1000 for v in values]
+    return {
+        "count": len(ms),
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+        "p99_ms": percentile(ms, 99),
+        "max_ms": max(ms) if ms else None,
+    }
+
+def synthetic_payloads(args):
+    rng = random.Random(args.seed)
+    request_id = 1
+    while True:
+        tmdb_id = rng.randint(1, args.titles)
+        approved = rng.random() < args.approved_ratio
+        yield {
+            "event": "Request Automatically Approved" if approved else "New Request Pending Approval",
+            "subject": f"Benchmark Title {tmdb_id}",
+            "media": {"media_type": rng.choice(("movie", "tv")), "tmdbId": tmdb_id,
+                      "status": "APPROVED" if approved else "PENDING"},
+            "request": {"request_id": request_id},
+        }
+        request_id += 1
+
+def recorded_payloads(args):
+    with open(args.payloads) as f:
+        recorded = [json.loads(line) for line in f if line.strip()]
+    if not recorded:
+        raise SystemExit(f"No payloads in {args.payloads}")
+    request_id = 1
+    while True:
+        for payload in recorded:
+            if not args.keep_ids:
+                payload = {**payload, "request": {**payload.get("request", {}), "request_id": request_id}}
+                request_id += 1
+            yield payload
+
+def launch_availarr(args, tmdb, overseerr, discord, workdir):
+    config = {
+        "TMDB_API_KEY": "bench",
+        "OVERSEERR_URL": overseerr.url,
+        "OVERSEERR_API_KEY": "bench",
+        "DISCORD_WEBHOOK_URL": discord.webhook_url,
+        "PROVIDERS": ["Netflix", "Hulu"],
+        "TMDB_CACHE_PERSIST": False,
+        "API_KEY": args.api_key,
+    }
+    for item in args.set:
+        key, _, value = item.partition("=")
+        try:
+            config[key] = json.loads(value)
+        except ValueError:
+            config[key] = value
+    with open(os.path.join(workdir, "config.json"), "w") as f:
+        json.dump(config, f)
+
+    port = _free_port()
+    env = {
+        **os.environ,
+        "CONFIG_PATH": os.path.join(workdir, "config.json"),
+        "TMDB_API_URL": f"{tmdb.url}/3",
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+    }
+    log = open(os.path.join(workdir, "availarr.log"), "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    return process, f"http://127.0.0.1:{port}", log
+
+async def wait_until_up(client, base_url, process=None, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError("Availarr exited during startup")
+        try:
+            await client.get(f"{base_url}/")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Availarr did not come up at {base_url}")
+
+async def run_load(args, base_url, overseerr):
+    payloads = recorded_payloads(args) if args.payloads else synthetic_payloads(args)
+    total = int(args.rate * args.duration)
+    latencies = []
+    statuses = Counter()
+    sent_at = {}
+
+    limits = httpx.Limits(max_connections=200, max_keepalive_connections=200)
+    async with httpx.AsyncClient(timeout=30.0, limits=limits) as client:
+        await wait_until_up(client, base_url, getattr(args, "process", None))
+        if args.api_key:
+            client.headers["X-Api-Key"] = args.api_key
+        else:
+            login = await client.post(f"{base_url}/login", data={"username": args.username, "password": args.password})
+            if "session" not in client.cookies:
+                raise RuntimeError(f"Login failed ({login.status_code}); pass --api-key or --username/--password")
+
+        async def send(payload, scheduled):
+            try:
+                response = await client.post(f"{base_url}/webhook", json=payload)
+                statuses[response.status_code] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+                return
+            # Measured from the scheduled send time so a stalled server can't hide its backlog
+            latencies.append(time.monotonic() - scheduled)
+            request_id = payload.get("request", {}).get("request_id")
+            if response.status_code == 202 and request_id is not None:
+                sent_at.setdefault(request_id, scheduled)
+
+        tasks = []
+        start = time.monotonic()
+        for i in range(total):
+            scheduled = start + i / args.rate
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(next(payloads), scheduled)))
+        await asyncio.gather(*tasks)
+        load_elapsed = time.monotonic() - start
+
+        # Wait for the background workers to act on every accepted webhook
+        deadline = time.monotonic() + args.drain
+        while time.monotonic() < deadline and not set(sent_at) <= set(overseerr.actions):
+            await asyncio.sleep(0.1)
+        actioned = {rid: overseerr.actions[rid] for rid in sent_at if rid in overseerr.actions}
+        end_to_end = [at - sent_at[rid] for rid, (_, at) in actioned.items()]
+        finished = max((at for _, at in actioned.values()), default=start)
+
+    return {
+        "target": base_url,
+        "offered_rate": args.rate,
+        "sent": total,
+        "statuses": {str(k): v for k, v in statuses.items()},
+        "webhook_throughput_rps": round(sum(statuses.values()) / load_elapsed, 1) if load_elapsed else None,
+        "webhook_latency": summarize(latencies),
+        "accepted": len(sent_at),
+        "actioned": len(actioned),
+        "actions": dict(Counter(action for action, _ in actioned.values())),
+        "processing_throughput_rps": round(len(actioned) / (finished - start), 1) if actioned else None,
+        "end_to_end_latency": summarize(end_to_end),
+    }
+
+def print_report(report):
+    def fmt(stats):
+        if not stats["count"]:
+            return "n/a"
+        return "  ".join(f"{k.replace('_ms', '')}={stats[k]:.1f}ms" for k in ("p50_ms", "p95_ms", "p99_ms", "max_ms"))
+
+    print(f"Target:            {report['target']}")
+    print(f"Sent:              {report['sent']} at {report['offered_rate']}/s  statuses={report['statuses']}")
+    print(f"Webhook:           {report['webhook_throughput_rps']} req/s  {fmt(report['webhook_latency'])}")
+    print(f"Processed:         {report['actioned']}/{report['accepted']} accepted  actions={report['actions']}")
+    print(f"End to end:        {report['processing_throughput_rps']} req/s  {fmt(report['end_to_end_latency'])}")
+    for name, stats in report["upstreams"].items():
+        print(f"Upstream {name + ':':<10} {stats['total']} calls  injected_errors={stats['injected_errors']}  {stats['calls']}")
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    tmdb = FakeTMDb(Faults(args.tmdb_latency, args.tmdb_jitter, args.tmdb_error_rate))
+    overseerr = FakeOverseerr(Faults(args.overseerr_latency, args.overseerr_jitter, args.overseerr_error_rate))
+    discord = FakeDiscord(Faults(args.discord_latency, args.discord_jitter, args.discord_error_rate),
+                          enforce_rate_limit=not args.no_discord_rate_limit)
+    upstreams = FakeUpstreams(tmdb, overseerr, discord)
+    upstreams.start()
+
+    process = log = None
+    if not args.target:
+        args.api_key = secrets.token_urlsafe(16)
+    with tempfile.TemporaryDirectory(prefix="availarr-bench-") as workdir:
+        try:
+            if args.target:
+                base_url = args.target.rstrip("/")
+                print(f"Point the target at TMDB_API_URL={tmdb.url}/3, OVERSEERR_URL={overseerr.url}, "
+                      f"DISCORD_WEBHOOK_URL={discord.webhook_url}", file=sys.stderr)
+            else:
+                process, base_url, log = launch_availarr(args, tmdb, overseerr, discord, workdir)
+                args.process = process
+            report = asyncio.run(run_load(args, base_url, overseerr))
+        except RuntimeError as e:
+            if log is not None:
+                log.flush()
+                with open(log.name) as f:
+                    sys.stderr.write(f.read()[-4000:])
+            raise SystemExit(f"Benchmark failed: {e}")
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=15)
+                log.close()
+            upstreams.stop()
+
+    report["upstreams"] = {s.name: s.stats() for s in (tmdb, overseerr, discord)}
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    p99 = report["webhook_latency"]["p99_ms"]
+    if args.max_p99 is not None and (p99 is None or p99 > args.max_p99):
+        print(f"FAIL: webhook p99 {p99} ms exceeds {args.max_p99} ms", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
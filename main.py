@@ -1,43 +1,164 @@
+from app.utils.startup import startup_profile
+
 import os
+import hmac
+import asyncio
+import time
 import secrets
+import tempfile
 import logging
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request, Form, Depends, HTTPException, status, Response
 from fastapi.responses import RedirectResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.routing import APIRoute
-from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
 
-from app.api import api_router
-from app.config_server import load_config, save_config, hash_value
-from app.auth import verify_session
+from app.utils.logging import setup_logging, log_event
+
+setup_logging()
+
+from app.api import api_router, machine_router
+from app.health import router as health_router, upstream_probes
+from app.config_server import load_config, merge_config, add_config_listener, CONFIG_DIR
+from app.auth import (
+    verify_session, verify_api_key_or_session, verify_password_async, hash_password_async, needs_rehash, login_limiter, configure_login_limiter
+)
+from app.utils.http import configure_http, close_client, warm_clients
+from app.utils.discord import dispatcher
+from app.utils.tmdb import (
+    TMDB_API_URL, init_provider_cache, provider_cache, init_provider_index, start_index_refresher, stop_index_refresher
+)
+from app.webhook import start_workers, stop_workers, decision_history, get_provider_matcher
+from app.reconcile import start_scheduler, stop_scheduler
+from app.utils.catalog import init_provider_catalog, start_catalog_refresher, stop_catalog_refresher
+from app.utils.shared import SHARED_STATE, FileLock, init_shared_state, start_janitor, stop_janitor
+from app.utils.events import configure_event_feed
+from app.utils.templating import STATIC_DIR, template_response, precompile_templates
+
+startup_profile.mark("imports")
+
+leader_lock = FileLock(os.path.join(CONFIG_DIR, ".leader.lock"))
+
+# --- Warm-up: runs after the server starts accepting; /healthz reports "warming" until it's done ---
+async def warm_up(config):
+    try:
+        with startup_profile.phase("warm_matcher"):
+            get_provider_matcher()
+        with startup_profile.phase("warm_templates"):
+            await asyncio.to_thread(precompile_templates)
+        with startup_profile.phase("warm_http"):
+            await warm_clients([TMDB_API_URL, config.get("OVERSEERR_URL"), config.get("DISCORD_WEBHOOK_URL")])
+    except Exception as e:
+        log_event("warmup_failed", error=str(e))
+    startup_profile.finish(float(config.get("STARTUP_BUDGET_MS", 2000)))
+
+# --- Lifespan: provider cache, decision history, background workers and shared upstream connection pool ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup_profile.mark("app_setup")
+    config = load_config()
+    # Applied now and again whenever the config snapshot changes
+    for configure in (configure_http, configure_login_limiter, configure_event_feed):
+        configure(config)
+        add_config_listener(configure)
+    init_shared_state(os.path.join(CONFIG_DIR, "state.db"))
+    init_provider_cache(config, os.path.join(CONFIG_DIR, "provider_cache.json"))
+    init_provider_index(config, os.path.join(CONFIG_DIR, "provider_index.db"))
+    init_provider_catalog(os.path.join(CONFIG_DIR, "providers.json"))
+    decision_history.start(config)
+    await start_workers()
+    start_janitor()
+    # With several workers, periodic jobs run only in whichever one holds the leader lock
+    leader = not SHARED_STATE or leader_lock.acquire(blocking=False)
+    if leader:
+        start_scheduler()
+        start_index_refresher(load_config)
+        start_catalog_refresher(load_config)
+        upstream_probes.start(config)
+    log_event("worker_started", pid=os.getpid(), shared_state=SHARED_STATE, leader=leader)
+    startup_profile.mark("lifespan")
+    warming = asyncio.create_task(warm_up(config))
+    yield
+    warming.cancel()
+    await upstream_probes.stop()
+    await stop_catalog_refresher()
+    await stop_index_refresher()
+    await stop_scheduler()
+    leader_lock.release()
+    await stop_workers()
+    await decision_history.stop()
+    await dispatcher.stop()
+    await stop_janitor()
+    provider_cache.save()
+    await close_client()
 
 # --- Initialize App ---
-app = FastAPI(strict_slashes=False)
+app = FastAPI(strict_slashes=False, lifespan=lifespan)
+
+# Static Files
+class CachedStaticFiles(StaticFiles):
+    """Static files with browser caching; URLs carrying ?v=<asset_version> never change, so they're immutable."""
+
+    async def get_response(self, path, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            versioned = b"v=" in scope.get("query_string", b"")
+            response.headers["Cache-Control"] = (
+                "public, max-age=31536000, immutable" if versioned else "public, max-age=86400"
+            )
+        return response
 
-# Templates & Static Files
-templates = Jinja2Templates(directory="app/templates")
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+app.mount("/static", CachedStaticFiles(directory=STATIC_DIR), name="static")
 
 # --- Session Secret Setup ---
-SECRET_FILE = os.path.join(os.getenv("CONFIG_PATH", "/config"), ".session_secret")
+SECRET_FILE = os.path.join(CONFIG_DIR, ".session_secret")
 
 def get_or_create_secret_key() -> str:
-    if os.path.exists(SECRET_FILE):
-        return open(SECRET_FILE).read().strip()
-    secret = secrets.token_hex(32)
-    os.makedirs(os.path.dirname(SECRET_FILE), exist_ok=True)
-    with open(SECRET_FILE, "w") as f:
+    # Workers starting together must agree on one secret, so write it to a
+    # temp file and link it into place; os.link fails if another worker won
+    if not os.path.exists(SECRET_FILE):
+        os.makedirs(os.path.dirname(SECRET_FILE), exist_ok=True)
+        secret = secrets.token_hex(32)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(SECRET_FILE), prefix=".secret.")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(secret)
+            os.link(tmp_path, SECRET_FILE)
+        except FileExistsError:
+            pass
+        except OSError:
+            # No hard links on this volume (SMB/CIFS, some FUSE mounts): create exclusively instead
+            _create_secret_exclusive(secret)
+        finally:
+            os.remove(tmp_path)
+    # A worker that lost an exclusive create may see the file before the winner has written it
+    for _ in range(50):
+        with open(SECRET_FILE) as f:
+            secret = f.read().strip()
+        if secret:
+            return secret
+        time.sleep(0.05)
+    raise RuntimeError(f"{SECRET_FILE} is empty")
+
+def _create_secret_exclusive(secret):
+    try:
+        fd = os.open(SECRET_FILE, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+    except FileExistsError:
+        return
+    with os.fdopen(fd, "w") as f:
         f.write(secret)
-    return secret
 
-SESSION_SECRET_KEY = get_or_create_secret_key()
+class LazySessionMiddleware(SessionMiddleware):
+    """SessionMiddleware that reads the secret when the middleware stack is built, not at import."""
+
+    def __init__(self, app, **kwargs):
+        super().__init__(app, secret_key=get_or_create_secret_key(), **kwargs)
 
 # Important: middleware must be added before routes for it to wrap correctly :contentReference[oaicite:1]{index=1}
 app.add_middleware(
-    SessionMiddleware,
-    secret_key=SESSION_SECRET_KEY,
+    LazySessionMiddleware,
     max_age=3600,
     same_site="lax",
     https_only=False
@@ -45,46 +166,75 @@ app.add_middleware(
 
 # --- Include Protected API Routes ---
 app.include_router(api_router, dependencies=[Depends(verify_session)])
+# Overseerr's webhook and metrics scrapers authenticate with the API key
+app.include_router(machine_router, dependencies=[Depends(verify_api_key_or_session)])
+# Liveness and readiness probes stay unauthenticated for orchestrators
+app.include_router(health_router)
 
 # --- Root & Page Routes ---
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
     if not request.session.get("user"):
-        return templates.TemplateResponse("login.html", {"request": request, "error": False})
-    return templates.TemplateResponse("index.html", {"request": request})
+        return template_response("login.html", {"request": request, "error": False})
+    return template_response("index.html", {"request": request})
 
 @app.post("/login")
 async def login(request: Request, username: str = Form(...), password: str = Form(...)):
+    client = request.client.host if request.client else "unknown"
+    # Only the client address is locked out; failures for a username just slow
+    # its logins down, so nobody else can lock the admin out of their account
+    ip_key, user_key = f"ip:{client}", f"user:{username}"
+    retry_after = login_limiter.retry_after(ip_key)
+    if retry_after:
+        logger.info(f"[AUDIT] Login attempt by '{username}' from {client} - LOCKED OUT")
+        return template_response(
+            "login.html", {"request": request, "error": False, "retry_after": int(retry_after) + 1},
+            status_code=429, headers={"Retry-After": str(int(retry_after) + 1)},
+        )
+
+    delay = login_limiter.delay(user_key)
+    if delay:
+        await asyncio.sleep(delay)
+
     config = load_config()
-    success = username == config.get("username") and hash_value(password) == config.get("password")
+    stored = config.get("password", "")
+    # Always run the hash so response time doesn't reveal whether the username exists
+    password_ok = await verify_password_async(password, stored)
+    success = hmac.compare_digest(username.encode(), str(config.get("username", "")).encode()) and password_ok
 
     logger.info(f"[AUDIT] Login attempt by '{username}' - {'SUCCESS' if success else 'FAILURE'}")
 
     if success:
+        login_limiter.reset(ip_key, user_key)
+        if needs_rehash(stored):
+            merge_config({"password": await hash_password_async(password)})
         request.session["user"] = username
         if config.get("require_password_change", True):
             return RedirectResponse("/change-password", status_code=302)
         return RedirectResponse("/", status_code=302)
 
+    login_limiter.record_failure(ip_key, user_key)
     # Render login page with error flag if login failed
-    return templates.TemplateResponse("login.html", {"request": request, "error": True})
+    return template_response("login.html", {"request": request, "error": True})
 
 
 @app.get("/change-password", response_class=HTMLResponse)
 async def change_password_page(request: Request):
-    return templates.TemplateResponse("change_password.html", {"request": request})
+    if not request.session.get("user"):
+        return RedirectResponse("/", status_code=302)
+    return template_response("change_password.html", {"request": request})
 
 @app.post("/change-password")
 async def change_password(request: Request, username: str = Form(...), password: str = Form(...)):
+    if not request.session.get("user"):
+        return RedirectResponse("/", status_code=302)
     logger.info(f"[AUDIT] Password change initiated for user '{username}'")
 
-    config = load_config()
-    config.update({
+    merge_config({
         "username": username,
-        "password": hash_value(password),
+        "password": await hash_password_async(password),
         "require_password_change": False
     })
-    save_config(config)
     request.session.clear()
     return RedirectResponse("/", status_code=302)
 
@@ -96,7 +246,7 @@ async def logout(request: Request):
 
 # --- Route Logging (Debug) ---
 logger = logging.getLogger("availarr")
-logging.basicConfig(level=logging.INFO)
-for route in app.routes:
-    if isinstance(route, APIRoute):
-        logger.info(f"Registered route: {route.path} - Methods: {', '.join(route.methods)}")
+if logger.isEnabledFor(logging.DEBUG):
+    for route in app.routes:
+        if isinstance(route, APIRoute):
+            logger.debug(f"Registered route: {route.path} - Methods: {', '.join(route.methods)}")